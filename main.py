@@ -18,9 +18,11 @@ last heard is controlled by the repeater app.
 
 import json, logging, os, threading, time
 import meshtastic.serial_interface
-from datetime import datetime, timedelta
+from datetime import datetime
 from zoneinfo import ZoneInfo
-from tinydb import TinyDB, Query
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+from tinydb.middlewares import CachingMiddleware
 from pubsub import pub
 from rich.console import Console
 from rich.panel import Panel
@@ -29,11 +31,25 @@ from rich import box
 
 import modules.shared as SharedState
 import modules.dbSync as dbSync
+import modules.activityStore as activityStore
+import modules.writeBehind as writeBehind
+import modules.nodeRegistry as nodeRegistry
+import modules.lastHeard as lastHeard
+import modules.positionIndex as positionIndex
+import modules.signalHistory as signalHistory
+import modules.compactor as compactor
+import modules.pipeline as pipeline
+import modules.dedup as dedup
+import modules.commands as cmdRegistry
+import modules.transmitter as transmitter
+import modules.capture as packetCapture
+import modules.metrics as metrics
 import modules.broadcast as broadcast
-import modules.met as METService
-import modules.mygps as mygps
+import modules.scheduler as jobScheduler
+import modules.metLog as metLog
 import modules.WebUI as WebUI
 import tools.general as general_tools
+import tools.migrate_nodedb as migrate_nodedb
 
 # startup dialog functions 
 def clear_screen():
@@ -116,26 +132,97 @@ def init_config():
         logging.info("Initialized configuration...")
         console.print(f"[bold green]✔[/bold green]  Initialized configuration...")
 
+# init the metrics registry
+def init_metrics():
+    global Metrics, packets_received, packets_duplicate
+
+    # counters, gauges and histograms exposed at /metrics of the web UI
+    Metrics = metrics.metricsregistry()
+    packets_received = Metrics.counter('mesh_packets_received_total',
+                                       'Packets received from the radio', ('portnum',))
+    packets_duplicate = Metrics.counter('mesh_packets_duplicate_total',
+                                        'Relayed copies of packets already received')
+
+    logging.info("Initialized metrics...")
+    console.print(f"[bold green]✔[/bold green]  Initialized metrics...")
+
+# init the packet ingestion pipeline
+def init_pipeline():
+    global ingest, seen_packets, capture, Signals
+
+    # received packets are recorded for tools/replay.py when capture is enabled
+    capture = None
+    if config.get('capture_on', 'Disabled') == "Enabled":
+        capture = packetCapture.packetcapture(path=config.get('capture_path', 'logs/packets.jsonl.gz'),
+                                              logging=logging)
+
+    # copies of a packet heard via several relays are dropped before queueing
+    seen_packets = dedup.seenpackets(config=config)
+
+    # RSSI/SNR of packets heard directly, in a fixed-size ring buffer per node
+    Signals = signalHistory.signalhistory(config=config)
+
+    # packets are queued from the meshtastic thread and handled by the workers
+    ingest = pipeline.pipeline(config=config,
+                               logging=logging,
+                               metrics=Metrics)
+    ingest.register("TEXT_MESSAGE_APP", handle_text)
+    ingest.register("NODEINFO_APP", handle_nodeinfo)
+    ingest.register("POSITION_APP", handle_position)
+
+    logging.info("Initialized packet pipeline...")
+    console.print(f"[bold green]✔[/bold green]  Initialized packet pipeline...")
+
 # init the Tinydb 
 def init_db():
-    global Nodes, NodeActivities
-
-    db = TinyDB(config.get('database_path', ''))
-    Nodes = db.table('Nodes')
-    NodeActivities = db.table('NodeActivities')
+    global db, Nodes, NodeActivities, writer, LastHeard, Positions
+
+    NodeActivities = activityStore.open_store(config)
+
+    # one-shot migration of the activity log that used to live in TinyDB
+    migrated = migrate_nodedb.migrate(config.get('database_path', ''), NodeActivities)
+    if migrated > 0:
+        logging.info(f"Migrated {migrated} activity records from TinyDB...")
+        console.print(f"[bold green]✔[/bold green]  Migrated {migrated} activity records...")
+
+    # writes are cached in memory and flushed to disk by the write-behind queue
+    db = TinyDB(config.get('database_path', ''), storage=CachingMiddleware(JSONStorage))
+    Nodes = nodeRegistry.noderegistry(db=db,
+                                      nodesdb=db.table('Nodes'))
+
+    # the latest node positions are kept with the node records and indexed in a grid
+    Positions = positionIndex.positionindex(cell_km=config.get('position_cell_km', 10))
+    for record in Nodes.all():
+        if record.get('latitude') is not None and record.get('longitude') is not None:
+            Positions.update(record['num'], record['latitude'], record['longitude'])
+
+    # Start the write-behind thread for packet driven database writes
+    writer = writeBehind.writebehind(nodesdb=Nodes,
+                                     activitydb=NodeActivities,
+                                     config=config,
+                                     logging=logging,
+                                     metrics=Metrics)
+    writer.start()
 
     sync_now = dbSync.dbsync(interface=interface,
                              config=config,
-                             nodesdb=Nodes)
+                             nodesdb=Nodes,
+                             logging=logging,
+                             metrics=Metrics)
     sync_now.now()
+
+    # seed the last heard map with the nodes heard in the active users window
+    LastHeard = lastHeard.lastheard()
+    since = int(time.time()) - int(config.get('active_users', 60))
+    for entry in NodeActivities.search_since(since):
+        LastHeard.touch(entry['Num'], entry['Time_Heard'])
     
     logging.info("Initialized Nodedb...")
     console.print(f"[bold green]✔[/bold green]  Initialized Nodedb...")
 
 # update or insert node information
 def upsert_nodedb(packet):
-    Activity_Time = datetime.now().strftime('%Y%m%d_%H%M%S')
-    node = Query()
+    Activity_Time = int(time.time())
     decoded = packet.get('decoded')
     user_data = decoded.get('user',{})
 
@@ -147,201 +234,319 @@ def upsert_nodedb(packet):
     Hardware_Model = user_data.get('hwModel', '')
     node_activity = packet['decoded']['portnum']
 
-    Nodes.upsert({
+    writer.upsert_node({
         'num': node_num,
         'id': node_id,
         'longName': Long_Name,
         'shortName': Short_Name,
         'macaddr': MacAddr,
         'hwModel': Hardware_Model
-    }, node.num == node_num)
+    })
 
-    NodeActivities.insert({
+    writer.insert_activity({
         'Num': node_num,
         'id': node_id,
         'Time_Heard': Activity_Time,
         'Activity': node_activity
     })
+    LastHeard.touch(node_num, Activity_Time)
+
+# store the latest position of a node
+def upsert_position(packet):
+    position = packet['decoded'].get('position', {})
+    latitude = position.get('latitude')
+    longitude = position.get('longitude')
+    if latitude is None and position.get('latitudeI') is not None:
+        latitude = position['latitudeI'] * 1e-7
+    if longitude is None and position.get('longitudeI') is not None:
+        longitude = position['longitudeI'] * 1e-7
+    # nodes without a fix report 0,0 or leave the fields out
+    if latitude is None or longitude is None or (latitude == 0 and longitude == 0):
+        return
+
+    node_num = packet.get('from')
+    record = {
+        'num': node_num,
+        'latitude': latitude,
+        'longitude': longitude,
+        'altitude': position.get('altitude', 0),
+        'positionTime': int(time.time())
+    }
+    # fromId is None for senders without a user record, keep the stored id then
+    if packet.get('fromId'):
+        record['id'] = packet['fromId']
+    writer.upsert_node(record)
+    Positions.update(node_num, latitude, longitude)
 
 def upsert_nodedb_activity(packet):
-    Activity_Time = datetime.now().strftime('%Y%m%d_%H%M%S')
+    Activity_Time = int(time.time())
     node_num = packet.get('from')
     node_id = packet.get('fromId')
     node_activity = packet['decoded']['portnum']
-    NodeActivities.insert({
+    writer.insert_activity({
         'Num': node_num,
         'id': node_id,
         'Time_Heard': Activity_Time,
         'Activity': node_activity
     })
+    LastHeard.touch(node_num, Activity_Time)
 
 # init thr additional modules
 def init_modules():
-    global broadcaster, syncer, MET, shared_data
+    global broadcaster, syncer, compact, MET, MetLog, shared_data, tx, Scheduler
+
+    # the sensor services need the Blinka and serial libraries, imported here so
+    # the packet handling can be loaded without them (see tools/replay.py)
+    import modules.met as METService
+    import modules.mygps as mygps
 
     shared_data = SharedState.SharedState()
 
-    # Start the MET service thread
+    # periodic jobs are run by the scheduler from the main thread, see main()
+    Scheduler = jobScheduler.scheduler(logging=logging)
+
+    # Start the transmit scheduler, the single outbound path to the mesh
+    tx = transmitter.transmitter(interface=interface,
+                                 config=config,
+                                 logging=logging,
+                                 metrics=Metrics)
+    tx_thread = threading.Thread(target=tx.run,
+                                 daemon=True)
+    tx_thread.start()
+
+    # Schedule the MET sampling, the samples are logged in batches for the weather page
+    MetLog = metLog.metlog(config=config, logging=logging)
+    MetLog.import_legacy()
     MET = METService.METService(logging=logging, 
                                 shared_data=shared_data, 
-                                config=config)
-    METService_thread = threading.Thread(target=MET.start, 
-                                         daemon=True)
-    METService_thread.start()
+                                config=config,
+                                metlog=MetLog)
+    Scheduler.add("met", MET.sample, MET.interval, delay=0,
+                  watch=("met_on", "met_interval", "met_oversample"))
 
     # Start the GPS service thread
     gps = mygps.mygps(logging=logging, 
                       shared_data=shared_data, 
-                      config=config)
+                      config=config,
+                      metrics=Metrics)
     mygps_thread = threading.Thread(target=gps.start, 
                                     daemon=True)
     mygps_thread.start()    
 
-    # Start the DB sync thread
+    # Schedule the DB sync, it already ran once in init_db
     syncer = dbSync.dbsync(interface=interface,
                            config=config, 
-                           nodesdb=Nodes,)    
-    syncer_thread = threading.Thread(target=syncer.run, 
-                                     daemon=True)
-    syncer_thread.start()
-
-    # Start the broadcast thread
-    broadcaster = broadcast.broadcast(interface=interface, 
+                           nodesdb=Nodes,
+                           logging=logging,
+                           metrics=Metrics)
+    Scheduler.add("dbsync", syncer.now, syncer.interval,
+                  watch=("sync_frequency",))
+
+    # Schedule the activity log compaction, starting now
+    compact = compactor.compactor(activitydb=NodeActivities,
+                                  config=config,
+                                  logging=logging)
+    Scheduler.add("compact", compact.now, compact.interval, delay=0,
+                  watch=("activity_compact_freq", "activity_retention"))
+
+    # Schedule the beacon, the emergency message replaces it while enabled
+    broadcaster = broadcast.broadcast(transmitter=tx, 
                                       config=config,
-                                      shared_data=shared_data)
-    broadcast_thread = threading.Thread(target=broadcaster.run, 
-                                        daemon=True)
-    broadcast_thread.start()
+                                      shared_data=shared_data,
+                                      lastheard=LastHeard,
+                                      logging=logging)
+    Scheduler.add("broadcast", broadcaster.tick, broadcaster.interval,
+                  watch=("broadcast_on", "broadcast_freq", "emergency_on", "emergency_freq"))
 
     # Start the web UI thread
     webui = WebUI.WebUI(interface=interface,
                         config=config, 
                         nodesdb=Nodes, 
                         Activity=NodeActivities,
+                        writer=writer,
+                        pipeline=ingest,
+                        dedup=seen_packets,
+                        transmitter=tx,
+                        positions=Positions,
+                        signals=Signals,
+                        metrics=Metrics,
+                        scheduler=Scheduler,
+                        metlog=MetLog,
                         logfiles=log_filename,
                         shared_data=shared_data)
     webui_thread = threading.Thread(target=webui.start, 
                                     daemon=True)
     webui_thread.start()
 
+    # Start handling the packets queued since the interface connected
+    ingest.start()
+
     logging.info("Initialized Modules...")
     console.print(f"[bold green]✔[/bold green]  Initialized Modules...")
 
+# init the command registry
+def init_commands():
+    global commands, geo
+
+    # distance helpers, created once and shared by the commands
+    geo = general_tools.general()
+
+    # reply caching and per-sender rate limits are declared per command
+    commands = cmdRegistry.commandregistry(config=config,
+                                           logging=logging)
+    commands.register("/info", cmd_info, cache_ttl=300)
+    commands.register("/signal", cmd_signal)
+    commands.register("/users", cmd_users, cache_ttl=5)
+    commands.register("/distance", cmd_distance, cache_ttl=60)
+    commands.register("/nearest", cmd_nearest)
+    commands.register("/admin", cmd_admin)
+
+    logging.info("Initialized commands...")
+    console.print(f"[bold green]✔[/bold green]  Initialized commands...")
+
 # command handler function
 def command_handler(packet):
-    message = packet['decoded']['text']
-    # Split by whitespace
-    parts = message.strip().split()
-    if not parts:
-        return "Empty command."
-
-    cmd = parts[0]
-    args = parts[1:]
-
-    match cmd:
-        case "/info":
-            msg = "Welcome to jkpg-mesh! Available commands:\n"
-            msg = msg+ "/users - online users\n"
-            msg = msg+ "/signal - get signal report\n"
-            msg = msg+ "/distance <lat> <lon> - /distance 57.7785 14.1697\n"
-            msg = msg+ "Please wait 10sec before sending next cmd."
-            return msg
-        case "/signal":
-            # extract rssi and snr from packet and formats return message
-            rssi = packet.get('rxRssi')
-            snr = packet.get('rxSnr')
-            if rssi is not None:
-                rssi_msg = f"{round(rssi, 2)} dBm"
-            else:
-                rssi_msg = "--.-- dBm"
-            if snr is not None:
-                snr_msg = f"{round(snr, 2)} dB"
-            else:
-                snr_msg = "--.-- dB"
-            msg = f"Repeater received you RSSI: {rssi_msg}  Received SNR: {snr_msg}"
-            return msg
-        case "/users":
-            # Get all nodes active last few minutes from the database and format the return message
-            msg = "Recent users:\n"
-            nodesAct = Query()
-            future_time = datetime.now() - timedelta(seconds=int(config.get('active_users', 60)))
-            formatted = future_time.strftime('%Y%m%d_%H%M%S')
-            results = NodeActivities.search(nodesAct.Time_Heard >= formatted)
-            unique_nums = list({entry['Num'] for entry in results if 'Num' in entry})
-
-            for num in unique_nums:
-                nodes = Query()
-                node_info = Nodes.search(nodes.num == num)
-                for match in node_info:
-                    line = f"{match.get('shortName', 'Unknown Node')}\n"
-                    if len(msg) + len(line) <= 200:
-                        msg += line
-                    else:
-                        break  # stop adding if we reach the limit
-            return msg
-        case "/distance":
-            # calculate the distance from the repeater to the given coordinates
-            try:
-                lat2 = float(args[0])
-                lon2 = float(args[1])
-            except Exception as e:
-                return "Please check format /distance 57.1234 14.1234"
-
-            theTools = general_tools.general()
-            distance = theTools.get_distance(
-                            float(config.get('repeater_lat', 0.0)),
-                            float(config.get('repeater_lon', 0.0)),
-                            lat2, 
-                            lon2)
-            return f"Your distance from repeater: {round(distance,2)} km"
-        case "/admin":
-            # Handle admin commands nut how do i do this secure
-            msg = ""
-            admin_cmd = args[0]
-            match admin_cmd:
-                case _:
-                    msg = "Unknown admin command."
-            return msg
+    return commands.dispatch(packet)
+
+def cmd_info(packet, args):
+    msg = "Welcome to jkpg-mesh! Available commands:\n"
+    msg = msg+ "/users - online users\n"
+    msg = msg+ "/signal - get signal report\n"
+    msg = msg+ "/distance <lat> <lon> - /distance 57.7785 14.1697\n"
+    msg = msg+ "/nearest [lat lon] - nodes closest to you\n"
+    msg = msg+ f"Please wait {int(config.get('command_rate_limit', 10))}sec before sending next cmd."
+    return msg
+
+def cmd_signal(packet, args):
+    # extract rssi and snr from packet and formats return message
+    rssi = packet.get('rxRssi')
+    snr = packet.get('rxSnr')
+    if rssi is not None:
+        rssi_msg = f"{round(rssi, 2)} dBm"
+    else:
+        rssi_msg = "--.-- dBm"
+    if snr is not None:
+        snr_msg = f"{round(snr, 2)} dB"
+    else:
+        snr_msg = "--.-- dB"
+    msg = f"Repeater received you RSSI: {rssi_msg}  Received SNR: {snr_msg}"
+    # add the average of the last hour when there is some history
+    history = Signals.samples(packet.get('from'), since=time.time() - 3600)
+    rssi_history = [rssi for _, rssi, _ in history if rssi is not None]
+    if len(rssi_history) > 1:
+        msg += f"\n1h avg RSSI: {round(sum(rssi_history) / len(rssi_history), 1)} dBm ({len(rssi_history)} pkts)"
+    return msg
+
+def cmd_users(packet, args):
+    # Get all nodes active last few minutes from the database and format the return message
+    msg = "Recent users:\n"
+    active_nums = LastHeard.active(int(config.get('active_users', 60)))
+
+    for num in active_nums:
+        node_info = Nodes.get(num)
+        if node_info is None:
+            continue
+        line = f"{node_info.get('shortName', 'Unknown Node')}\n"
+        if len(msg) + len(line) <= 200:
+            msg += line
+        else:
+            break  # stop adding if we reach the limit
+    return msg
+
+def cmd_distance(packet, args):
+    # calculate the distance from the repeater to the given coordinates
+    try:
+        lat2 = float(args[0])
+        lon2 = float(args[1])
+    except Exception as e:
+        return "Please check format /distance 57.1234 14.1234"
+
+    distance = geo.get_distance(
+                    float(config.get('repeater_lat', 0.0)),
+                    float(config.get('repeater_lon', 0.0)),
+                    lat2, 
+                    lon2)
+    return f"Your distance from repeater: {round(distance,2)} km"
+
+def cmd_nearest(packet, args):
+    # list the nodes closest to the given coordinates or to the sender's last position
+    node_num = packet.get('from')
+    if args:
+        try:
+            lat = float(args[0])
+            lon = float(args[1])
+        except Exception as e:
+            return "Please check format /nearest 57.1234 14.1234"
+    else:
+        position = Positions.get(node_num)
+        if position is None:
+            return "No position known for you, use /nearest <lat> <lon>"
+        lat, lon = position
+
+    nearest = Positions.nearest(lat, lon, k=5, exclude=node_num)
+    if not nearest:
+        return "No nodes with a known position."
+    msg = "Nearest nodes:\n"
+    for num, distance in nearest:
+        node_info = Nodes.get(num) or {}
+        line = f"{node_info.get('shortName') or numToHex(num)} {round(distance, 1)} km\n"
+        if len(msg) + len(line) <= 200:
+            msg += line
+        else:
+            break  # stop adding if we reach the limit
+    return msg
+
+def cmd_admin(packet, args):
+    # Handle admin commands nut how do i do this secure
+    msg = ""
+    admin_cmd = args[0] if args else ""
+    match admin_cmd:
         case _:
-            return None
+            msg = "Unknown admin command."
+    return msg
 
 # Callback for when a packet is received
 def onReceive(packet, interface):
-    try:
-        # print("-------------------------------------------------------")
-        # print(packet)
-        # print("-------------------------------------------------------")
-        match packet['decoded']['portnum']:
-            case "TELEMETRY_APP":
-                #Still need to understand what we will do here 
-                pass
-            case "TEXT_MESSAGE_APP":
-                fromId = packet['fromId']
-                body = packet['decoded']['text']
-                shared_data.add_message(fromId, body)
-                logging.debug(f"Text package message: {body}")
-                upsert_nodedb_activity(packet)
-                msg = command_handler(packet)
-                if msg != None:
-                    sendMessage(interface=interface, toID=fromId, message=msg)
-            case "POSITION_APP":
-                #Still need to understand what we will do here 
-                pass
-            case "NODEINFO_APP":
-                # check if log in DB, if not add. 
-                logging.info(f"Id: {packet['decoded']['user']['id']}")
-                logging.info(f"Long Name: {packet['decoded']['user']['longName']}") 
-                logging.info(f"Short Name: {packet['decoded']['user']['shortName']}") 
-                logging.info(f"Hardware Model: {packet['decoded']['user']['hwModel']}")
-                upsert_nodedb(packet)
-            case "ALERT_APP":
-                #Still need to understand what we will do here 
-                pass
-            case _:
-                #Still need to understand what we will do here 
-                pass
-    except Exception as e:
-        logging.warning(f"Error parsing packet: {e}")
+    # print("-------------------------------------------------------")
+    # print(packet)
+    # print("-------------------------------------------------------")
+    # Only queue the packet here, the pipeline workers do the handling.
+    # TELEMETRY_APP and ALERT_APP have no handler yet.
+    if capture is not None:
+        capture.record(packet)
+    packets_received.inc(portnum=packet.get('decoded', {}).get('portnum', 'UNKNOWN'))
+    Signals.add_packet(packet)
+    if seen_packets.seen(packet):
+        packets_duplicate.inc()
+        logging.debug(f"Duplicate packet {packet.get('id')} from {packet.get('fromId')}")
+        return
+    ingest.submit(packet, interface)
+
+# Pipeline handler for TEXT_MESSAGE_APP packets
+def handle_text(packet, interface):
+    fromId = packet['fromId']
+    body = packet['decoded']['text']
+    shared_data.add_message(fromId, body)
+    logging.debug(f"Text package message: {body}")
+    upsert_nodedb_activity(packet)
+    msg = command_handler(packet)
+    if msg != None:
+        sendMessage(interface=interface, toID=fromId, message=msg)
+
+# Pipeline handler for NODEINFO_APP packets
+def handle_nodeinfo(packet, interface):
+    # check if log in DB, if not add. 
+    logging.info(f"Id: {packet['decoded']['user']['id']}")
+    logging.info(f"Long Name: {packet['decoded']['user']['longName']}") 
+    logging.info(f"Short Name: {packet['decoded']['user']['shortName']}") 
+    logging.info(f"Hardware Model: {packet['decoded']['user']['hwModel']}")
+    upsert_nodedb(packet)
+
+# Pipeline handler for POSITION_APP packets
+def handle_position(packet, interface):
+    logging.debug(f"Position from {packet.get('fromId')}: {packet['decoded'].get('position')}")
+    upsert_position(packet)
+    upsert_nodedb_activity(packet)
 
 # Callback for when the connection is established
 def onConnection(interface, topic=pub.AUTO_TOPIC):
@@ -358,8 +563,8 @@ def onConnectionLost(interface):
 
 # Send a message to a specific node
 def sendMessage(interface, toID, message):
-    logging.debug(f"Sending message to {toID}: {message}")
-    interface.sendText(text=message, destinationId=toID)
+    logging.debug(f"Queueing message to {toID}: {message}")
+    tx.send(message, toID, tx.COMMAND)
 
 # init Meshtastic
 def init_meshunit():
@@ -408,11 +613,42 @@ def init_meshunit():
         console.print(f"[bold red]❌[/bold red]  Meshtastic function started...")
         MeshError = str(e)
 
+# stop the threads and close the stores; each step runs even if an earlier
+# one failed or its service was never started
+def shutdown():
+    steps = (
+        ("ingest", "stop", "Packet pipeline stopped..."),
+        ("tx", "stop", "Transmitter stopped..."),
+        # commits the in-flight batch and the queue before the databases close
+        ("writer", "stop", "Database writes flushed..."),
+        ("interface", "close", "Meshtastic interface closed..."),
+        ("db", "close", "Node database closed..."),
+        ("NodeActivities", "close", "Activity database closed..."),
+        ("capture", "close", "Packet capture closed..."),
+        ("MetLog", "close", "MET log flushed..."),
+    )
+    for name, method, message in steps:
+        service = globals().get(name)
+        if service is None:
+            continue
+        try:
+            getattr(service, method)()
+            logging.info(message)
+            console.print(f"[bold green]✔[/bold green]  {message}")
+        except Exception as e:
+            logging.error(f"Failed to {method} {name}: {e}")
+            console.print(f"[bold red]❌[/bold red]  Failed to {method} {name}...")
+    if globals().get("config") is not None:
+        saveConfig(config)
+
 # main function
 def main():
     init_startup_screen()
     init_logging()
     init_config()
+    init_metrics()
+    init_commands()
+    init_pipeline()
     init_meshunit()
     init_db()
     init_modules()
@@ -420,8 +656,8 @@ def main():
     logging.info("Initialized Repeater ...")
     console.print(f"[bold green]✔[/bold green]  Initialized Repeater ...")
 
-    while True:
-        time.sleep(0.1)
+    # the main thread runs the periodic jobs until interrupted
+    Scheduler.run()
 
 if __name__ == "__main__":
     try:
@@ -432,11 +668,4 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        # This ensures the connection is closed cleanly whether there was an error or not
-        saveConfig(config)
-        console.print(f"[bold green]✔[/bold green]  Saving configuration...")
-        logging.info("Closing the Meshtastic interface...")
-        console.print(f"[bold green]✔[/bold green]  Closing the Meshtastic interface...")
-        interface.close()
-        logging.info("Meshtastic interface closed...")
-        console.print(f"[bold green]✔[/bold green]  Meshtastic interface closed...")
\ No newline at end of file
+        shutdown()
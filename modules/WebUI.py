@@ -1,12 +1,26 @@
+import base64
+import json
 import logging
+import time
 import meshtastic.serial_interface
-from flask import Flask, render_template, request, flash, redirect, url_for
+import modules.beaconTemplate as beaconTemplate
+import modules.metLog as metLog
+from flask import Flask, Response, g, render_template, request, flash, redirect, url_for, jsonify
 
 class WebUI:
     def __init__(self, 
                  interface: meshtastic.serial_interface.SerialInterface = None, 
                  nodesdb=None, 
                  Activity=None,
+                 writer=None,
+                 pipeline=None,
+                 dedup=None,
+                 transmitter=None,
+                 positions=None,
+                 signals=None,
+                 metrics=None,
+                 scheduler=None,
+                 metlog=None,
                  logfiles = None, 
                  config=None,
                  shared_data=None):
@@ -15,6 +29,15 @@ class WebUI:
         self.interface = interface
         self.nodesdb = nodesdb
         self.nodeactivity = Activity
+        self.writer = writer
+        self.pipeline = pipeline
+        self.dedup = dedup
+        self.transmitter = transmitter
+        self.positions = positions
+        self.signals = signals
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.metlog = metlog
         self.logfiles = logfiles
         self.config = config if config else {}
         self.shared_data = shared_data
@@ -26,6 +49,7 @@ class WebUI:
         self.app.config['SECRET_KEY'] = '123456789'
         self.app.config['TEMPLATES_AUTO_RELOAD'] = True
         self.app.logger.setLevel('ERROR')  # Suppress Flask startup messages
+        self.app.add_template_filter(self.format_epoch, 'epoch')
 
         # Suppress Werkzeug request logs
         log = logging.getLogger('werkzeug')
@@ -35,23 +59,59 @@ class WebUI:
         self.app.add_url_rule("/setup", "setup", self.setup, methods=['GET', 'POST'])
         self.app.add_url_rule("/nodes", "nodes", self.nodes)
         self.app.add_url_rule("/activity", "activity", self.activity)
+        self.app.add_url_rule("/api/nodes", "api_nodes", self.api_nodes)
+        self.app.add_url_rule("/api/activity", "api_activity", self.api_activity)
+        self.app.add_url_rule("/map", "map", self.map)
+        self.app.add_url_rule("/api/positions", "api_positions", self.api_positions)
+        self.app.add_url_rule("/signal", "signal", self.signal)
+        self.app.add_url_rule("/api/signal", "api_signal", self.api_signal)
         self.app.add_url_rule("/logfile", "logfile", self.logfile)
         self.app.add_url_rule("/weather", "weather", self.weather)
+        self.app.add_url_rule("/api/met", "api_met", self.api_met)
         self.app.add_url_rule("/gps", "gps_live", self.gps_live)
         self.app.add_url_rule("/gps_ui", "gps_ui", self.gps_ui)
         self.app.add_url_rule("/messages", "messages", self.messages, methods=['GET', 'POST'])
         self.app.add_url_rule("/get_messages", "get_messages", self.get_messages)
         self.app.add_url_rule("/send_message", "send_message", self.send_message, methods=['POST'])
+
+        if self.metrics is not None:
+            self._request_seconds = self.metrics.histogram('mesh_http_request_seconds',
+                                                           'Time to answer a web UI request',
+                                                           ('endpoint', 'method', 'status'))
+            self.app.before_request(self._start_timer)
+            self.app.after_request(self._observe_request)
+            self.app.add_url_rule("/metrics", "metrics", self.metrics_text)
+
+    def _start_timer(self):
+        g.request_started = time.perf_counter()
+
+    def _observe_request(self, response):
+        """Record the request time per endpoint, method and status code."""
+        started = g.get('request_started')
+        if started is not None:
+            self._request_seconds.observe(time.perf_counter() - started,
+                                          endpoint=request.endpoint or 'unknown',
+                                          method=request.method,
+                                          status=response.status_code)
+        return response
+
+    def metrics_text(self):
+        """Route exposing the metrics in the Prometheus text format."""
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
     
     def index(self):
         """Route for the main index page."""
         info = self.interface.getMyNodeInfo()
         return render_template('index.html', 
                                info=info, 
-                               reload_seconds=self.shared_data.get_counter(),
+                               reload_seconds=(self.scheduler.next_run('broadcast') or 0) if self.scheduler else 0,
                                broadcast=self.config.get('broadcast_on', 'Disabled'),
                                emergency=self.config.get('emergency_on', 'Disabled'),
-                               METdata=self.shared_data.get_metdata())
+                               METdata=self.shared_data.get_metdata(),
+                               dbstats=self.writer.stats() if self.writer else None,
+                               ingeststats=self.pipeline.stats() if self.pipeline else None,
+                               dupstats=self.dedup.stats() if self.dedup else None,
+                               txstats=self.transmitter.stats() if self.transmitter else None)
     
     def setup(self):
         """Route for the setup page (handles GET and POST)."""
@@ -64,10 +124,20 @@ class WebUI:
 
         if request.method == 'POST':
             # Update config values from form
+            changed = []
             for item in config_items:
                 new_val = request.form.get(item['key'])
                 if new_val is not None:
+                    if new_val != self.config.get(item['key']):
+                        changed.append(item['key'])
                     self.config[item['key']] = new_val
+            # jobs depending on a changed value are rescheduled right away
+            if changed and self.scheduler:
+                self.scheduler.config_changed(changed)
+            for key in ('broadcast_message', 'emergency_message'):
+                if key in changed:
+                    for error in beaconTemplate.beacontemplate(self.config[key]).errors:
+                        flash(f'{key}: {error}', 'error')
             flash('Configuration updated successfully! ✅', 'success')
             # Optionally, save config to file here
             return redirect(url_for('setup'))
@@ -77,19 +147,203 @@ class WebUI:
     def nodes(self):
         """
         Route for the nodes page.
-        Retrieves all nodes from the database and renders them in the template.
+        The node list is loaded page by page from /api/nodes.
         """
-        nodes = self.nodesdb.all()
-        return render_template('nodes.html', nodes=nodes)
+        return render_template('nodes.html')
     
     def activity(self):
         """
         Route for the activity page.
-        Retrieves all node activities from the database and renders them in the template.
+        The activity log is loaded page by page from /api/activity.
+        """
+        return render_template('activity.html')
+
+    @staticmethod
+    def format_epoch(value, fmt='%Y-%m-%d %H:%M:%S'):
+        """
+        Format an epoch timestamp as local time for display.
+        Registered as the 'epoch' template filter.
         """
-        activities = self.nodeactivity.all()
-        return render_template('activity.html', activity=activities)
+        if value is None:
+            return '—'
+        return time.strftime(fmt, time.localtime(value))
+
+    @staticmethod
+    def _encode_cursor(cursor):
+        """Encode a pagination cursor as an opaque URL-safe string."""
+        if cursor is None:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(value):
+        """Decode a cursor made by _encode_cursor, None if missing or invalid."""
+        if not value:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(value.encode()))
+            return cursor if isinstance(cursor, list) else None
+        except Exception:
+            return None
+
+    @staticmethod
+    def _node_filter(value):
+        """
+        Split a node filter into (num, node_id).
+        Accepts a node id such as '!a1b2c3d4' or a decimal node number.
+        """
+        if not value:
+            return None, None
+        if value.startswith('!'):
+            return None, value
+        try:
+            return int(value), None
+        except ValueError:
+            return None, value
+
+    @staticmethod
+    def _page_limit():
+        """Read the 'limit' query argument, clamped to 1..500 (default 100)."""
+        limit = request.args.get('limit', 100, type=int) or 100
+        return max(1, min(limit, 500))
+
+    def api_nodes(self):
+        """
+        JSON endpoint returning one page of nodes.
+        Query arguments: node, q (name search), sort, order, cursor, limit.
+        """
+        num, node_id = self._node_filter(request.args.get('node', '').strip())
+        records, next_cursor = self.nodesdb.page(
+            num=num,
+            node_id=node_id,
+            search=request.args.get('q', '').strip() or None,
+            sort=request.args.get('sort', 'num'),
+            order='desc' if request.args.get('order') == 'desc' else 'asc',
+            cursor=self._decode_cursor(request.args.get('cursor')),
+            limit=self._page_limit())
+        return jsonify({'items': records, 'next_cursor': self._encode_cursor(next_cursor)})
+
+    def api_activity(self):
+        """
+        JSON endpoint returning one page of node activity.
+        Query arguments: node, portnum, since, until (epoch seconds), sort, order, cursor, limit.
+        'Time_Heard' is returned as epoch seconds and 'Time_Heard_Text' as formatted local time.
+        With rollup=hour the hourly rollups of compacted activity are returned
+        instead, filtered by node, portnum, since and until, ordered by hour
+        and limited to one page; narrow until to read older hours.
+        """
+        num, node_id = self._node_filter(request.args.get('node', '').strip())
+        if request.args.get('rollup') == 'hour':
+            records = self.nodeactivity.rollups(
+                num=num,
+                node_id=node_id,
+                portnum=request.args.get('portnum', '').strip() or None,
+                since=request.args.get('since', type=int),
+                until=request.args.get('until', type=int),
+                order='asc' if request.args.get('order') == 'asc' else 'desc',
+                limit=self._page_limit())
+            for record in records:
+                record['Hour_Text'] = self.format_epoch(record['Hour'])
+            return jsonify({'items': records, 'next_cursor': None})
+        records, next_cursor = self.nodeactivity.page(
+            num=num,
+            node_id=node_id,
+            portnum=request.args.get('portnum', '').strip() or None,
+            since=request.args.get('since', type=int),
+            until=request.args.get('until', type=int),
+            sort='num' if request.args.get('sort') == 'num' else 'time',
+            order='asc' if request.args.get('order') == 'asc' else 'desc',
+            cursor=self._decode_cursor(request.args.get('cursor')),
+            limit=self._page_limit())
+        for record in records:
+            record['Time_Heard_Text'] = self.format_epoch(record['Time_Heard'])
+        return jsonify({'items': records, 'next_cursor': self._encode_cursor(next_cursor)})
     
+    def map(self):
+        """Route for the node map page, the positions are loaded from /api/positions."""
+        return render_template("map.html",
+                               repeater_lat=float(self.config.get('repeater_lat', 0.0)),
+                               repeater_lon=float(self.config.get('repeater_lon', 0.0)))
+
+    def api_positions(self):
+        """
+        JSON endpoint returning the latest node positions.
+        Query arguments:
+          - lat, lon: center point; node: center on the position of this node
+          - radius: only nodes within this many km of the center
+          - k: only the k nodes nearest to the center (default 'limit')
+          - limit: maximum number of nodes (1..500, default 100)
+        Without a center every node with a known position is returned.
+        """
+        limit = self._page_limit()
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        num, node_id = self._node_filter(request.args.get('node', '').strip())
+        if node_id is not None:
+            record = self.nodesdb.get_by_id(node_id)
+            num = record.get('num') if record else None
+        if num is not None:
+            center = self.positions.get(num)
+            if center is None:
+                return jsonify({'error': 'no position known for node'}), 404
+            lat, lon = center
+
+        if lat is None or lon is None:
+            found = [(record['num'], None) for record in self.nodesdb.all()
+                     if self.positions.get(record['num']) is not None][:limit]
+        elif request.args.get('radius') is not None:
+            found = self.positions.within(lat, lon, request.args.get('radius', 0.0, type=float),
+                                          exclude=num)[:limit]
+        else:
+            k = max(1, min(request.args.get('k', limit, type=int) or limit, limit))
+            found = self.positions.nearest(lat, lon, k=k, exclude=num)
+
+        items = []
+        for node_num, distance in found:
+            record = self.nodesdb.get(node_num) or {'num': node_num}
+            item = {key: record.get(key) for key in
+                    ('num', 'id', 'longName', 'shortName', 'latitude', 'longitude', 'altitude', 'positionTime')}
+            if distance is not None:
+                item['distance_km'] = round(distance, 3)
+            items.append(item)
+        center = {'latitude': lat, 'longitude': lon} if lat is not None and lon is not None else None
+        return jsonify({'center': center, 'items': items})
+
+    def signal(self):
+        """Route for the signal history page, the data is loaded from /api/signal."""
+        return render_template("signal.html")
+
+    def api_signal(self):
+        """
+        JSON endpoint returning the RSSI/SNR history.
+        Without 'node' it lists the nodes with history and their last values.
+        With 'node' it returns min/avg/max per bucket; query arguments:
+        window (seconds, default 86400) and bucket (seconds, default 3600).
+        """
+        num, node_id = self._node_filter(request.args.get('node', '').strip())
+        if node_id is not None:
+            record = self.nodesdb.get_by_id(node_id)
+            num = record.get('num') if record else None
+            if num is None:
+                return jsonify({'error': 'unknown node'}), 404
+        if num is None:
+            items = self.signals.nodes()
+            for item in items:
+                record = self.nodesdb.get(item['num']) or {}
+                item['id'] = record.get('id')
+                item['shortName'] = record.get('shortName')
+                item['last_heard_text'] = self.format_epoch(item['last_heard'])
+            return jsonify({'items': items})
+
+        window = max(60, request.args.get('window', 86400, type=int) or 86400)
+        bucket = max(1, request.args.get('bucket', 3600, type=int) or 3600)
+        # keep the number of buckets reasonable
+        bucket = max(bucket, window // 1000)
+        return jsonify({'num': num,
+                        'window': window,
+                        'bucket': bucket,
+                        'items': self.signals.summary(num, window=window, bucket=bucket)})
+
     def logfile(self):
         """Route for the logfile page.
         Reads the log file and renders its content in the template.
@@ -100,24 +354,34 @@ class WebUI:
 
     def weather(self):
         """
-        Route for the weather page. Reads MET data log and passes it to the template for graphing.
+        Route for the weather page. The chart fetches its data from /api/met.
         """
-        import os, json
-        met_log_path = os.path.join("logs", "met_data.jsonl")
-        met_data = []
-        try:
-            with open(met_log_path, "r") as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line)
-                        met_data.append(entry)
-                    except Exception:
-                        continue
-        except Exception as e:
-            met_data = []
-        # Sort by timestamp just in case
-        met_data.sort(key=lambda x: x.get("timestamp", 0))
-        return render_template('weather.html', met_data=met_data)
+        return render_template('weather.html')
+
+    def api_met(self):
+        """
+        JSON endpoint returning the MET log of a time range, downsampled per field.
+        Query arguments: start and end (epoch seconds) or window (seconds
+        before now, default 86400), points (default 500), fields
+        (comma separated, default all).
+        The range is limited to 'met_api_max_days' days before end, since
+        every sample in it is read and downsampled on the web thread.
+        """
+        if self.metlog is None:
+            return jsonify({'error': 'MET log not available'}), 404
+        end = request.args.get('end', type=int) or int(time.time())
+        start = request.args.get('start', type=int)
+        if start is None:
+            start = end - max(60, request.args.get('window', 86400, type=int) or 86400)
+        start = max(start, end - int(self.config.get('met_api_max_days', 31)) * 86400)
+        points = min(5000, max(3, request.args.get('points', 500, type=int) or 500))
+        fields = [field for field in request.args.get('fields', '').split(',') if field in metLog.FIELDS]
+        count, series = self.metlog.series(start, end, points, fields or metLog.FIELDS)
+        return jsonify({'start': start,
+                        'end': end,
+                        'points': points,
+                        'count': count,
+                        'series': series})
 
     def gps_ui(self):
         return render_template("gps.html")
@@ -137,7 +401,8 @@ class WebUI:
                 'altitude': pos.get('altitude', 0),
                 'altitude_units': pos.get('altitude_units', 0),
                 'timestamp': self.shared_data.get_gps_time(),
-                'satellites': sats
+                'satellites': sats,
+                'stats': self.shared_data.get_gps_stats()
             }
             from flask import jsonify
             return jsonify(gps_data)
@@ -159,11 +424,11 @@ class WebUI:
         msg = request.form.get("message", "").strip()
         if msg:
             try:
-                # Send using Meshtastic interface
-                self.interface.sendText(text=msg, destinationId="^all")
+                # Queue for the transmit scheduler at the lowest priority
+                self.transmitter.send(msg, "^all", self.transmitter.WEBCHAT)
                 # Log to shared_data for UI
                 self.shared_data.add_message("me", msg)
-                return jsonify({"status": "ok", "message": msg})
+                return jsonify({"status": "queued", "message": msg})
             except Exception as e:
                 return jsonify({"status": "error", "error": str(e)})
         return jsonify({"status": "error", "error": "Empty message"})
@@ -0,0 +1,343 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+def legacy_time_to_epoch(value):
+    """
+    Convert a legacy '%Y%m%d_%H%M%S' local time string to epoch seconds.
+    Values that are already numbers are returned as int.
+    :param value: The legacy time string or an epoch number.
+    :return: Epoch seconds as int.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.strptime(value, '%Y%m%d_%H%M%S').timestamp())
+
+class SQLiteActivityStore:
+    """
+    This class stores the node activity log in an append-only SQLite table.
+    The database runs in WAL mode so an insert only appends to the journal
+    instead of rewriting the whole file, and the table is indexed on node
+    number and heard time.
+    Records are returned as dicts with the same keys the TinyDB table used
+    ('Num', 'id', 'Time_Heard', 'Activity'); 'Time_Heard' is an integer
+    epoch timestamp and is formatted for display by the web layer.
+    Old raw records can be folded into per-node, per-hour rollups with
+    compact() to keep the database bounded in size.
+    """
+
+    def __init__(self, path='db/activity.db'):
+        """
+        Open (or create) the activity database.
+        :param path: Path to the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        """
+        Create the activity tables and their indexes if they do not exist.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS node_activity ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " num INTEGER,"
+                " node_id TEXT,"
+                " time_heard INTEGER NOT NULL,"
+                " activity TEXT)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_activity_num_time "
+                "ON node_activity (num, time_heard)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_activity_time "
+                "ON node_activity (time_heard)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS activity_rollup ("
+                " num INTEGER,"
+                " node_id TEXT,"
+                " hour INTEGER NOT NULL,"
+                " activity TEXT,"
+                " count INTEGER NOT NULL,"
+                " first_heard INTEGER NOT NULL,"
+                " last_heard INTEGER NOT NULL,"
+                " PRIMARY KEY (num, hour, activity))")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS migrations ("
+                " name TEXT PRIMARY KEY,"
+                " records INTEGER NOT NULL,"
+                " time INTEGER NOT NULL)")
+
+    @staticmethod
+    def _to_row(record):
+        return (record.get('Num'),
+                record.get('id'),
+                record.get('Time_Heard'),
+                record.get('Activity'))
+
+    @staticmethod
+    def _to_record(row):
+        return {
+            'Num': row['num'],
+            'id': row['node_id'],
+            'Time_Heard': row['time_heard'],
+            'Activity': row['activity']
+        }
+
+    def insert(self, record):
+        """
+        Append a single activity record.
+        :param record: Dict with 'Num', 'id', 'Time_Heard' and 'Activity'.
+        """
+        self.insert_many([record])
+
+    def insert_many(self, records):
+        """
+        Append several activity records in one transaction.
+        :param records: Iterable of activity record dicts.
+        :return: Number of records written.
+        """
+        rows = [self._to_row(record) for record in records]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO node_activity (num, node_id, time_heard, activity) "
+                "VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def import_records(self, records, name):
+        """
+        Append the records of a one-off import and mark the import as done,
+        in a single transaction, so an interrupted import leaves nothing
+        behind and a finished one is never repeated.
+        :param records: Iterable of activity record dicts, consumed lazily.
+        :param name: Name of the import recorded in the migrations table.
+        :return: Number of records written.
+        """
+        count = 0
+
+        def rows():
+            nonlocal count
+            for record in records:
+                count += 1
+                yield self._to_row(record)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO node_activity (num, node_id, time_heard, activity) "
+                "VALUES (?, ?, ?, ?)", rows())
+            self._conn.execute(
+                "INSERT INTO migrations (name, records, time) VALUES (?, ?, ?)",
+                (name, count, int(time.time())))
+        return count
+
+    def migrated(self, name):
+        """
+        Tell whether a one-off import already finished.
+        :param name: Name of the import.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone() is not None
+
+    def all(self):
+        """Return every activity record, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT num, node_id, time_heard, activity "
+                "FROM node_activity ORDER BY id").fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def search_since(self, time_heard):
+        """
+        Return all activity records heard at or after the given time.
+        :param time_heard: Time in epoch seconds.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT num, node_id, time_heard, activity "
+                "FROM node_activity WHERE time_heard >= ? ORDER BY time_heard",
+                (time_heard,)).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def page(self, num=None, node_id=None, portnum=None, since=None, until=None,
+             sort='time', order='desc', cursor=None, limit=100):
+        """
+        Return one page of activity records using keyset pagination.
+        :param num: Only records of this node number.
+        :param node_id: Only records of this node id.
+        :param portnum: Only records of this portnum (activity).
+        :param since: Only records heard at or after this time (epoch seconds).
+        :param until: Only records heard before this time (epoch seconds).
+        :param sort: 'time' to sort by arrival or 'num' to sort by node number.
+        :param order: 'asc' or 'desc'.
+        :param cursor: The cursor returned with the previous page, or None.
+        :param limit: Maximum number of records in the page.
+        :return: Tuple (records, next_cursor); next_cursor is None on the last page.
+        """
+        where = []
+        params = []
+        if num is not None:
+            where.append("num = ?")
+            params.append(num)
+        if node_id is not None:
+            where.append("node_id = ?")
+            params.append(node_id)
+        if portnum is not None:
+            where.append("activity = ?")
+            params.append(portnum)
+        if since is not None:
+            where.append("time_heard >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("time_heard < ?")
+            params.append(until)
+
+        # a cursor of the other sort or an edited one starts at the first page
+        size = 2 if sort == 'num' else 1
+        if cursor is not None and (not isinstance(cursor, (list, tuple)) or len(cursor) != size
+                                   or not all(isinstance(v, int) and not isinstance(v, bool) for v in cursor)):
+            cursor = None
+
+        op = '<' if order == 'desc' else '>'
+        direction = 'DESC' if order == 'desc' else 'ASC'
+        if sort == 'num':
+            if cursor is not None:
+                where.append(f"(num, id) {op} (?, ?)")
+                params.extend(cursor)
+            order_by = f"num {direction}, id {direction}"
+        else:
+            if cursor is not None:
+                where.append(f"id {op} ?")
+                params.append(cursor[0])
+            order_by = f"id {direction}"
+
+        query = "SELECT id, num, node_id, time_heard, activity FROM node_activity"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {order_by} LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = [last['num'], last['id']] if sort == 'num' else [last['id']]
+        return [self._to_record(row) for row in rows], next_cursor
+
+    def compact(self, before):
+        """
+        Fold all raw activity records heard before the given time into the
+        hourly rollup table and delete them, in one transaction.
+        Each rollup row holds the number of packets per node, hour and
+        portnum together with the first and last heard time.
+        Hours are epoch seconds of the start of the (UTC) hour.
+        :param before: Time in epoch seconds.
+        :return: Number of raw records that were folded.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO activity_rollup "
+                "(num, node_id, hour, activity, count, first_heard, last_heard) "
+                "SELECT num, MAX(node_id), time_heard - time_heard % 3600, activity, "
+                "COUNT(*), MIN(time_heard), MAX(time_heard) "
+                "FROM node_activity WHERE time_heard < ? "
+                "GROUP BY num, time_heard - time_heard % 3600, activity "
+                "ON CONFLICT (num, hour, activity) DO UPDATE SET "
+                "count = count + excluded.count, "
+                "first_heard = MIN(first_heard, excluded.first_heard), "
+                "last_heard = MAX(last_heard, excluded.last_heard)",
+                (before,))
+            folded = self._conn.execute(
+                "DELETE FROM node_activity WHERE time_heard < ?",
+                (before,)).rowcount
+        return folded
+
+    def rollups(self, num=None, node_id=None, portnum=None, since=None, until=None,
+                order='asc', limit=None):
+        """
+        Return the hourly activity rollups.
+        :param num: Only rollups of this node number.
+        :param node_id: Only rollups of this node id.
+        :param portnum: Only rollups of this portnum (activity).
+        :param since: Only hours starting at or after this time (epoch seconds).
+        :param until: Only hours starting before this time (epoch seconds).
+        :param order: 'asc' for the oldest hour first or 'desc' for the newest.
+        :param limit: Maximum number of rollups, None for all.
+        :return: List of dicts with 'Num', 'id', 'Hour', 'Activity', 'Count',
+                 'First_Heard' and 'Last_Heard'.
+        """
+        where = []
+        params = []
+        if num is not None:
+            where.append("num = ?")
+            params.append(num)
+        if node_id is not None:
+            where.append("node_id = ?")
+            params.append(node_id)
+        if portnum is not None:
+            where.append("activity = ?")
+            params.append(portnum)
+        if since is not None:
+            where.append("hour >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("hour < ?")
+            params.append(until)
+
+        direction = 'DESC' if order == 'desc' else 'ASC'
+        query = ("SELECT num, node_id, hour, activity, count, first_heard, last_heard "
+                 "FROM activity_rollup")
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY hour {direction}, num {direction}, activity {direction}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{
+            'Num': row['num'],
+            'id': row['node_id'],
+            'Hour': row['hour'],
+            'Activity': row['activity'],
+            'Count': row['count'],
+            'First_Heard': row['first_heard'],
+            'Last_Heard': row['last_heard']
+        } for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM node_activity").fetchone()[0]
+
+    def close(self):
+        """Checkpoint the WAL and close the database connection."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+
+# Available activity log backends, selected by the 'activity_backend' config key
+BACKENDS = {
+    'sqlite': SQLiteActivityStore,
+}
+
+def open_store(config):
+    """
+    Create the activity store selected in the configuration.
+    :param config: Configuration dictionary.
+    :return: An activity store instance.
+    """
+    backend = config.get('activity_backend', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown activity backend: {backend}")
+    return BACKENDS[backend](config.get('activity_db_path', 'db/activity.db'))
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+
+# Meshtastic modem presets: spreading factor, bandwidth in kHz, coding rate denominator (4/x)
+MODEM_PRESETS = {
+    'SHORT_TURBO': (7, 500, 5),
+    'SHORT_FAST': (7, 250, 5),
+    'SHORT_SLOW': (8, 250, 5),
+    'MEDIUM_FAST': (9, 250, 5),
+    'MEDIUM_SLOW': (10, 250, 5),
+    'LONG_TURBO': (11, 500, 8),
+    'LONG_FAST': (11, 250, 5),
+    'LONG_MODERATE': (11, 125, 8),
+    'LONG_SLOW': (12, 125, 8),
+    'VERY_LONG_SLOW': (12, 62.5, 8),
+}
+
+PREAMBLE_SYMBOLS = 16   # Meshtastic preamble length
+PACKET_OVERHEAD = 20    # mesh packet header and Data protobuf around the text
+
+class loraairtime:
+    """
+    This class predicts the time on air of a LoRa packet from the modem
+    settings of the local radio, using the Semtech SX127x/SX126x formula
+    (explicit header, CRC on, low data rate optimization above 16 ms symbols).
+    The modem settings are read from the local node config once and cached
+    for MODEM_CACHE_SECONDS; if the radio does not report them the
+    'tx_modem_preset' config value is used.
+    """
+
+    MODEM_CACHE_SECONDS = 600
+
+    def __init__(self, interface=None, config=None, logging=None):
+        """
+        Initialize the airtime calculator.
+        :param interface: The interface object for the meshtastic unit.
+        :param config: The configuration object that contains the fallback preset.
+        :param logging: Logger instance for logging messages.
+        """
+        self.interface = interface
+        self.config = config
+        self.logging = logging
+        self._lock = threading.Lock()
+        self._modem = None
+        self._modem_read = 0.0
+        self._cache = {}  # payload bytes -> seconds, for the cached modem
+
+    def modem(self):
+        """
+        Return the cached modem settings, re-reading them when the cache expired.
+        :return: Dict with 'preset', 'sf', 'bw_khz' and 'cr'.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._modem is None or now - self._modem_read >= self.MODEM_CACHE_SECONDS:
+                modem = self._read_modem()
+                if modem != self._modem:
+                    self._cache = {}
+                    self.logging.info(f"LoRa modem for airtime estimates: {modem}")
+                self._modem = modem
+                self._modem_read = now
+            return self._modem
+
+    def invalidate(self):
+        """Forget the cached modem settings, e.g. after the radio config changed."""
+        with self._lock:
+            self._modem = None
+
+    def _read_modem(self):
+        """Read the modem settings of the local node, falling back to the config preset."""
+        try:
+            lora = self.interface.localNode.localConfig.lora
+            if not lora.use_preset and lora.spread_factor and lora.bandwidth:
+                return {'preset': 'CUSTOM',
+                        'sf': int(lora.spread_factor),
+                        'bw_khz': float(lora.bandwidth),
+                        'cr': int(lora.coding_rate) or 5}
+            from meshtastic.protobuf import config_pb2
+            name = config_pb2.Config.LoRaConfig.ModemPreset.Name(lora.modem_preset)
+            if name in MODEM_PRESETS:
+                return self._preset(name)
+            self.logging.warning(f"Unknown modem preset {name}, using the configured preset")
+        except Exception as e:
+            self.logging.debug(f"Could not read the LoRa config of the radio: {e}")
+        return self._preset(self.config.get('tx_modem_preset', 'LONG_FAST'))
+
+    @staticmethod
+    def _preset(name):
+        sf, bw_khz, cr = MODEM_PRESETS.get(name, MODEM_PRESETS['LONG_FAST'])
+        return {'preset': name if name in MODEM_PRESETS else 'LONG_FAST',
+                'sf': sf, 'bw_khz': bw_khz, 'cr': cr}
+
+    @staticmethod
+    def time_on_air(payload_bytes, sf, bw_khz, cr):
+        """
+        Time on air of one LoRa packet.
+        :param payload_bytes: PHY payload length in bytes.
+        :param sf: Spreading factor (7..12).
+        :param bw_khz: Bandwidth in kHz.
+        :param cr: Coding rate denominator, 5..8 for 4/5..4/8.
+        :return: Seconds on air.
+        """
+        symbol_s = (2 ** sf) / (bw_khz * 1000)
+        low_data_rate = 1 if symbol_s > 0.016 else 0
+        preamble_s = (PREAMBLE_SYMBOLS + 4.25) * symbol_s
+        numerator = 8 * payload_bytes - 4 * sf + 28 + 16
+        symbols = 8 + max(math.ceil(numerator / (4 * (sf - 2 * low_data_rate))) * cr, 0)
+        return preamble_s + symbols * symbol_s
+
+    def estimate(self, text):
+        """
+        Predict the time on air of a text message with the current modem.
+        :param text: The message text.
+        :return: Seconds on air.
+        """
+        size = len(text.encode('utf-8')) + PACKET_OVERHEAD
+        modem = self.modem()
+        with self._lock:
+            seconds = self._cache.get(size)
+            if seconds is None:
+                seconds = self._cache[size] = self.time_on_air(size, modem['sf'], modem['bw_khz'], modem['cr'])
+            return seconds
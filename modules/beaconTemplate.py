@@ -0,0 +1,124 @@
+import string
+
+# Largest Data payload of a Meshtastic packet (mesh_pb2.Constants.DATA_PAYLOAD_LEN)
+try:
+    from meshtastic.protobuf import mesh_pb2
+    PAYLOAD_LIMIT = int(mesh_pb2.Constants.DATA_PAYLOAD_LEN)
+except Exception:
+    PAYLOAD_LIMIT = 233
+
+# Placeholders a beacon template may use, with a description for the setup page
+FIELDS = {
+    'met': "MET summary (T1, T2, H, Pstat, Psea)",
+    'temp1': "AHT20 temperature in C",
+    'temp2': "BMP280 temperature in C",
+    'humidity': "Relative humidity in %",
+    'pressure_station': "Station pressure in hPa",
+    'pressure_sea': "Sea-level pressure in hPa",
+    'gps': "Position as 'lat,lon'",
+    'lat': "Latitude",
+    'lon': "Longitude",
+    'alt': "Altitude in m",
+    'users': "Number of active users",
+    'uptime': "Repeater uptime, e.g. '3d4h'",
+    'pressure_trend': "Sea-level pressure change over 3 hours in hPa",
+    'pressure_tendency': "Pressure tendency, e.g. 'falling slowly'",
+}
+# Rolling statistics of the MET values over 'met_stats_window'
+for _field in ('temp1', 'temp2', 'humidity', 'pressure_station', 'pressure_sea'):
+    FIELDS[f'{_field}_min'] = f"Lowest {_field} in the statistics window"
+    FIELDS[f'{_field}_max'] = f"Highest {_field} in the statistics window"
+    FIELDS[f'{_field}_mean'] = f"Mean {_field} in the statistics window"
+
+# Suffix appended to templates without MET placeholders while 'met_on' is enabled
+MET_SUFFIX = ("\n T1:{temp1:.1f}C T2:{temp2:.1f}C H:{humidity:.1f}%"
+              " Pstat:{pressure_station:.1f}hPa Psea:{pressure_sea:.1f}hPa")
+MET_FIELDS = {'met', 'temp1', 'temp2', 'humidity', 'pressure_station', 'pressure_sea',
+              'pressure_trend', 'pressure_tendency'} | {field for field in FIELDS if field.endswith(('_min', '_max', '_mean'))}
+
+class beacontemplate:
+    """
+    This class compiles a beacon message template such as
+    'Hello from {users} users, {met}' once into literal text and
+    placeholder fields, and renders it from a snapshot of values.
+    The last rendered text is cached and reused while the values of the
+    fields it uses do not change.
+    Literal braces are written as '{{' and '}}'. Unknown placeholders and
+    malformed templates are kept as plain text and reported in 'errors'.
+    """
+
+    def __init__(self, source):
+        """
+        Compile a template.
+        :param source: The template text.
+        """
+        self.source = source
+        self.errors = []
+        self._parts = []   # (literal, field name or None, format spec)
+        self._cache_key = None
+        self._cache_text = None
+        try:
+            for literal, field, spec, conversion in string.Formatter().parse(source):
+                if field is not None and field not in FIELDS:
+                    self.errors.append(f"Unknown placeholder {{{field}}}")
+                    literal += "{" + field + (f":{spec}" if spec else "") + "}"
+                    field = None
+                self._parts.append((literal, field, spec or ''))
+        except ValueError as e:
+            self.errors.append(f"Invalid template: {e}")
+            self._parts = [(source, None, '')]
+        self.fields = {field for _, field, _ in self._parts if field is not None}
+
+    def render(self, values):
+        """
+        Render the template.
+        :param values: Dict of placeholder name -> value; missing values render as '-'.
+        :return: The message text.
+        """
+        key = tuple(values.get(field) for field in sorted(self.fields))
+        if key == self._cache_key:
+            return self._cache_text
+        out = []
+        for literal, field, spec in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = values.get(field)
+            if value is None:
+                out.append('-')
+                continue
+            try:
+                out.append(format(value, spec))
+            except (TypeError, ValueError):
+                out.append(str(value))
+        text = ''.join(out)
+        self._cache_key = key
+        self._cache_text = text
+        return text
+
+def fit_payload(text, limit=PAYLOAD_LIMIT):
+    """
+    Cut a message to the Meshtastic payload limit without splitting a UTF-8 character.
+    :param text: The message text.
+    :param limit: Maximum size in bytes.
+    :return: Tuple (text, True if it was cut).
+    """
+    encoded = text.encode('utf-8')
+    if len(encoded) <= limit:
+        return text, False
+    return encoded[:limit].decode('utf-8', errors='ignore'), True
+
+def format_uptime(seconds):
+    """
+    Format a duration as '3d4h', '4h12m' or '12m'.
+    :param seconds: Duration in seconds.
+    """
+    seconds = int(seconds)
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    if days:
+        return f"{days}d{hours}h"
+    if hours:
+        return f"{hours}h{minutes}m"
+    return f"{minutes}m"
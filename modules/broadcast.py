@@ -1,115 +1,113 @@
 import time
 
+import modules.beaconTemplate as beaconTemplate
+
 class broadcast:
-    def __init__(self,interface=None, config=None, shared_data=None):
+    def __init__(self,transmitter=None, config=None, shared_data=None, lastheard=None, logging=None):
         """
         This class handles broadcasting messages to all nodes in the network.
-        :param interface: The interface to send messages through.
+        Messages are handed to the transmit scheduler, which defers beacons
+        while the channel is busy. The job scheduler calls tick() every
+        interval().
+        'broadcast_message' and 'emergency_message' are templates (see
+        modules/beaconTemplate.py), compiled again only when their text in
+        the config changes.
+        :param transmitter: The transmit scheduler to send messages through.
         :param config: Configuration dictionary containing broadcast settings.
+        :param shared_data: Shared state with the MET and GPS data.
+        :param lastheard: Last heard map used for the active user count.
+        :param logging: Logger instance for logging messages.
         """
-        self.interface = interface
+        self.transmitter = transmitter
         self.config = config
-        self.status = False
-        self.Duty_cycle = 0.0
         self.shared_data = shared_data
-        self.baseC = 0
+        self.lastheard = lastheard
+        self.logging = logging
+        self.started = time.monotonic()
+        self._templates = {}  # config key -> ((source, met_on), compiled template)
+        self._met = beaconTemplate.beacontemplate(beaconTemplate.MET_SUFFIX.lstrip())
 
-    def run(self):
-        """ 
-        This method runs the broadcast loop, sending messages at specified intervals.
-        It also handles emergency messages if the emergency status is enabled.
+    def interval(self):
         """
-        self.status = True
-        self.shared_data.set_counter(int(self.config.get('broadcast_freq', 300)))
-        self.baseC = self.config.get('broadcast_freq', 300)
-
-        last_emergency_state = False  # Track previous state
-
-        while self.status:
-            if self.config.get("broadcast_on") != "Enabled":
-                time.sleep(1)
-                continue
-            
-            if self.baseC != self.config.get('broadcast_freq', 300):
-                self.baseC = self.config.get('broadcast_freq', 300)
-                self.shared_data.set_counter(int(self.config.get('broadcast_freq', 300)))
-
-            counter = self.shared_data.get_counter()
-            emergency_on = self.config.get("emergency_on") == "Enabled"
+        Return the seconds between two broadcasts: 'emergency_freq' while
+        the emergency broadcast is enabled, 'broadcast_freq' otherwise.
+        """
+        if self.config.get("emergency_on") == "Enabled":
+            return int(self.config.get("emergency_freq", 300))
+        return int(self.config.get("broadcast_freq", 300))
 
-            # Detect change in emergency state
-            if emergency_on != last_emergency_state:
-                if emergency_on:
-                    # Emergency just enabled → reset counter for emergency freq
-                    freq = int(self.config.get("emergency_freq", 300))
-                    self.shared_data.set_counter(freq)
-                else:
-                    # Emergency just disabled → reset counter for normal broadcast freq
-                    freq = int(self.config.get("broadcast_freq", 300))
-                    self.shared_data.set_counter(freq)
+    def tick(self):
+        """
+        Send the broadcast that is due: the emergency message if the
+        emergency status is enabled, otherwise the normal beacon.
+        Nothing is sent while broadcasting is disabled.
+        """
+        if self.config.get("broadcast_on") != "Enabled":
+            return
 
-                counter = self.shared_data.get_counter()  # refresh local counter
+        if self.config.get("emergency_on") == "Enabled":
+            # Emergency broadcast
+            msg = self.render("emergency_message", "Error")
+            self.transmitter.send(msg, "^all", self.transmitter.EMERGENCY)
+            return
 
-            last_emergency_state = emergency_on
+        # Normal broadcast, deferred by the transmitter while the duty cycle is high
+        msg = self.render("broadcast_message", "Hello Jönköping!")
+        self.transmitter.send(msg, "^all", self.transmitter.BEACON)
 
-            if counter <= 0:
-                if emergency_on:
-                    # Emergency broadcast
-                    msg = self.config.get("emergency_message", "Error")
-                    freq = int(self.config.get("emergency_freq", 300))
-                    self.interface.sendText(text=msg, destinationId="^all")
-                    self.shared_data.set_counter(freq)
+    def render(self, key, default=""):
+        """
+        Render a message template from the config with the current values,
+        cut to the Meshtastic payload limit.
+        :param key: Config key of the template, e.g. 'broadcast_message'.
+        :param default: Template used when the key is missing.
+        :return: The message text.
+        """
+        template = self._template(key, default)
+        msg = template.render(self._snapshot(template.fields))
+        msg, cut = beaconTemplate.fit_payload(msg)
+        if cut:
+            self.logging.warning(f"{key} is longer than {beaconTemplate.PAYLOAD_LIMIT} bytes and was cut")
+        return msg
 
-                else:
-                    # Normal broadcast
-                    self.Duty_cycle = self.calculate_duty_cycle()
-                    if self.Duty_cycle <= 3.0:
-                        msg = self.config.get("broadcast_message", "Hello Jönköping!")
-                        # Only add MET data if enabled in config
-                        if self.config.get("met_on", "Disabled") == "Enabled":
-                            met = self.shared_data.get_metdata()
-                            met_msg = (
-                                f"\n T1:{met['temp1']:.1f}C"
-                                f" T2:{met['temp2']:.1f}C"
-                                f" H:{met['humidity']:.1f}%"
-                                f" Pstat:{met['pressure_station']:.1f}hPa"
-                                f" Psea:{met['pressure_sea']:.1f}hPa"
-                            )
-                            msg += met_msg
-                        freq = int(self.config.get("broadcast_freq", 300))
-                        self.interface.sendText(text=msg, destinationId="^all")
-                        self.shared_data.set_counter(freq)
-                    else:
-                        # Duty cycle too high → retry sooner
-                        self.shared_data.set_counter(60)
-            else:
-                self.shared_data.set_counter(counter - 1)
+    def _template(self, key, default):
+        """Return the compiled template of a config key, compiling it when the text changed."""
+        source = self.config.get(key, default)
+        # Only add MET data if enabled in config and the template has no MET placeholder
+        met_on = self.config.get("met_on", "Disabled") == "Enabled"
+        compiled = self._templates.get(key)
+        if compiled is not None and compiled[0] == (source, met_on):
+            return compiled[1]
 
-            time.sleep(1)
+        template = beaconTemplate.beacontemplate(source)
+        if met_on and not template.fields & beaconTemplate.MET_FIELDS:
+            template = beaconTemplate.beacontemplate(source + beaconTemplate.MET_SUFFIX)
+        for error in template.errors:
+            self.logging.warning(f"{key}: {error}")
+        self._templates[key] = ((source, met_on), template)
+        return template
 
-    def stop(self):
-        """
-        This method stops the broadcast loop by setting the status to False.
-        """
-        self.status = False
-    
-    def numToHex(self,node_num):
-        """ Converts a node number to a hexadecimal string prefixed with '!'.
-        :param node_num: The node number to convert.
-        :return: A string representing the node number in hexadecimal format.
-        """
-        return '!' + hex(node_num)[2:]
-    
-    def calculate_duty_cycle(self):
+    def _snapshot(self, fields):
         """
-        This method calculates the duty cycle of the local node based on its device metrics.
-        It retrieves the air utilization metric and returns it as a float.
-        :return: Duty cycle as a float.
+        Collect the current values of the placeholders a template uses.
+        :param fields: Set of placeholder names.
+        :return: Dict of placeholder name -> value.
         """
-        my_node_num = self.interface.localNode.nodeNum
-        local_node = self.interface.nodes.get(self.numToHex(node_num=my_node_num), {})
-        metrics = local_node.get("deviceMetrics", {})
-        duty_cycle = metrics.get("airUtilTx")
-        if duty_cycle is None:
-            return 0.0
-        return float(duty_cycle)
\ No newline at end of file
+        values = {}
+        if fields & beaconTemplate.MET_FIELDS:
+            met = self.shared_data.get_metdata()
+            values.update(met)
+            values['met'] = self._met.render(met)
+        if fields & {'gps', 'lat', 'lon', 'alt'}:
+            pos = self.shared_data.get_gps_pos() if self.shared_data.get_gps_fix() else {}
+            # without a GPS fix the configured repeater position is used
+            lat = pos.get('latitude') or float(self.config.get('repeater_lat', 0.0))
+            lon = pos.get('longitude') or float(self.config.get('repeater_lon', 0.0))
+            alt = pos.get('altitude') or float(self.config.get('altitude', 0))
+            values.update({'lat': round(lat, 5), 'lon': round(lon, 5), 'alt': round(alt),
+                           'gps': f"{lat:.4f},{lon:.4f}"})
+        if 'users' in fields and self.lastheard is not None:
+            values['users'] = len(self.lastheard.active(int(self.config.get('active_users', 60))))
+        if 'uptime' in fields:
+            values['uptime'] = beaconTemplate.format_uptime(time.monotonic() - self.started)
+        return values
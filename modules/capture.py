@@ -0,0 +1,107 @@
+import base64
+import gzip
+import json
+import threading
+import time
+
+FORMAT = "mesh-capture"
+VERSION = 1
+
+def _to_jsonable(value):
+    """
+    Convert a packet dict to plain JSON types.
+    The protobuf 'raw' objects are dropped and bytes are stored as base64.
+    """
+    if isinstance(value, dict):
+        return {key: _to_jsonable(item) for key, item in value.items() if key != 'raw'}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+def _from_jsonable(value):
+    """Restore the bytes values converted by _to_jsonable."""
+    if isinstance(value, dict):
+        if len(value) == 1 and '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        return {key: _from_jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_jsonable(item) for item in value]
+    return value
+
+class packetcapture:
+    """
+    This class records received packet dicts to a gzip compressed JSON lines
+    file for later replay with tools/replay.py.
+    The first line is a header, every following line holds the time of the
+    packet relative to the start of the capture ('t') and the packet ('p').
+    """
+
+    def __init__(self, path='logs/packets.jsonl.gz', logging=None):
+        """
+        Open a new capture file.
+        :param path: Path of the capture file, overwritten if it exists.
+        :param logging: Logger instance for logging messages.
+        """
+        self.path = path
+        self.logging = logging
+        self.count = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        self._file.write(json.dumps({'format': FORMAT, 'version': VERSION, 'started': int(time.time())}) + "\n")
+
+    def record(self, packet):
+        """
+        Append a packet to the capture.
+        :param packet: The packet dict from meshtastic.
+        """
+        try:
+            line = json.dumps({'t': round(time.monotonic() - self._start, 3),
+                               'p': _to_jsonable(packet)}, separators=(',', ':'))
+        except Exception as e:
+            self.logging.warning(f"Failed to capture packet: {e}")
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        """Flush and close the capture file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def read_header(path):
+    """
+    Read the header of a capture file.
+    :param path: Path of the capture file.
+    :return: Header dict with 'format', 'version' and 'started' (epoch seconds).
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+    if header.get('format') != FORMAT:
+        raise ValueError(f"{path} is not a packet capture file")
+    return header
+
+def read_capture(path):
+    """
+    Read a capture file written by packetcapture.
+    :param path: Path of the capture file.
+    :return: Generator of (relative time in seconds, packet dict).
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != FORMAT:
+            raise ValueError(f"{path} is not a packet capture file")
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            yield entry['t'], _from_jsonable(entry['p'])
@@ -0,0 +1,122 @@
+import threading
+import time
+
+class commandregistry:
+    """
+    This class dispatches text commands such as '/info' to their handlers.
+    Every command declares:
+      - cache_ttl: seconds a reply is reused for the same command and
+        arguments instead of being computed again (0 disables caching)
+      - rate_limit: seconds a sender has to wait after a command before
+        this command is answered again; requests inside that window are
+        ignored so floods do not generate airtime
+    """
+
+    def __init__(self, config=None, logging=None):
+        """
+        Initialize the command registry.
+        :param config: The configuration object.
+        :param logging: Logger instance for logging messages.
+        """
+        self.config = config
+        self.logging = logging
+        self._commands = {}
+        self._lock = threading.Lock()
+        self._cache = {}        # (name, args) -> (expires, reply)
+        self._last_sender = {}  # sender -> time of the last answered command
+        self._pruned = None     # time of the last _prune()
+        self._stats = {}        # name -> counters
+
+    def register(self, name, handler, cache_ttl=0, rate_limit=None):
+        """
+        Register a command.
+        :param name: The command, including the leading '/'.
+        :param handler: Callable taking (packet, args) and returning the reply text or None.
+        :param cache_ttl: Seconds a reply is cached for the same arguments.
+        :param rate_limit: Seconds between answered commands per sender,
+                           defaults to the 'command_rate_limit' config value
+                           read on every command, so config changes apply at once.
+        """
+        self._commands[name] = {
+            'handler': handler,
+            'cache_ttl': cache_ttl,
+            'rate_limit': rate_limit
+        }
+        self._stats[name] = {'calls': 0, 'cache_hits': 0, 'rate_limited': 0}
+
+    def names(self):
+        """Return the names of the registered commands."""
+        return list(self._commands)
+
+    def dispatch(self, packet):
+        """
+        Answer a text message if it is a registered command.
+        :param packet: The TEXT_MESSAGE_APP packet.
+        :return: The reply text, or None if the message is not a command or
+                 the sender is rate limited.
+        """
+        message = packet['decoded']['text']
+        # Split by whitespace
+        parts = message.strip().split()
+        if not parts:
+            return "Empty command."
+
+        name = parts[0]
+        args = tuple(parts[1:])
+        command = self._commands.get(name)
+        if command is None:
+            return None
+
+        sender = packet.get('fromId')
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            stats = self._stats[name]
+            stats['calls'] += 1
+            last = self._last_sender.get(sender)
+            if last is not None and now - last < self._rate_limit(command):
+                stats['rate_limited'] += 1
+                self.logging.info(f"Rate limited {name} from {sender}")
+                return None
+            self._last_sender[sender] = now
+
+            cached = self._cache.get((name, args))
+            if cached is not None and cached[0] > now:
+                stats['cache_hits'] += 1
+                return cached[1]
+
+        reply = command['handler'](packet, list(args))
+
+        if command['cache_ttl'] > 0 and reply is not None:
+            with self._lock:
+                self._cache[(name, args)] = (now + command['cache_ttl'], reply)
+        return reply
+
+    def _rate_limit(self, command):
+        """Return the rate limit of a command in seconds."""
+        if command['rate_limit'] is not None:
+            return command['rate_limit']
+        return int(self.config.get('command_rate_limit', 10))
+
+    def _prune(self, now):
+        """
+        Drop expired cache entries and senders outside every rate limit window.
+        Runs at most once per longest rate limit (at least once a second), so
+        the maps stay bounded without a full scan on every command.
+        Must be called with the lock held.
+        """
+        longest = max((self._rate_limit(command) for command in self._commands.values()), default=0)
+        if self._pruned is not None and now - self._pruned < max(1, longest):
+            return
+        self._pruned = now
+        self._cache = {key: value for key, value in self._cache.items() if value[0] > now}
+        self._last_sender = {sender: last for sender, last in self._last_sender.items()
+                             if now - last < longest}
+
+    def stats(self):
+        """
+        Return the per-command counters.
+        :return: Dict of command name -> calls, cache hits and rate limited requests.
+        """
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
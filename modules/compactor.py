@@ -0,0 +1,46 @@
+import time
+
+class compactor:
+    """
+    This class enforces the retention policy of the activity log.
+    Raw activity records older than 'activity_retention' seconds are folded
+    into per-node, per-hour rollups every 'activity_compact_freq' seconds.
+    """
+
+    def __init__(self, activitydb=None, config=None, logging=None):
+        """
+        Initialize the compactor.
+        :param activitydb: The activity store to compact.
+        :param config: The configuration object that contains the retention settings.
+        :param logging: Logger instance for logging messages.
+        """
+        self.activitydb = activitydb
+        self.config = config
+        self.logging = logging
+
+    def interval(self):
+        """
+        Return the seconds between two scheduled compactions ('activity_compact_freq').
+        The job scheduler calls now() at start and then every interval.
+        """
+        return int(self.config.get('activity_compact_freq', 3600))
+
+    def now(self):
+        """
+        Immediately fold the raw records older than the retention window.
+        A retention of 0 keeps all raw records.
+        :return: Number of raw records that were folded.
+        """
+        retention = int(self.config.get('activity_retention', 604800))
+        if retention <= 0:
+            return 0
+        before = int(time.time()) - retention
+        try:
+            start = time.perf_counter()
+            folded = self.activitydb.compact(before)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.logging.info(f"Compacted {folded} activity records into rollups in {elapsed_ms:.1f} ms")
+            return folded
+        except Exception as e:
+            self.logging.error(f"Failed to compact activity log: {e}")
+            return 0
@@ -1,70 +1,92 @@
 import time
-from tinydb import Query
 
 class dbsync:
     """
-    This class updates a local tinydb database  
+    This class updates a local tinydb database
     """
 
-    def __init__(self, interface=None, config=None, nodesdb=None):
+    def __init__(self, interface=None, config=None, nodesdb=None, logging=None, metrics=None):
         """
         Initialize the dbsync class with the interface, config, and nodesdb.
         :param interface: The interface object for the meshtastic unit.
         :param config: The configuration object that contains sync frequency.
-        :param nodesdb: The tinydb database object where node information will be stored.
+        :param nodesdb: The node registry where node information will be stored.
+        :param logging: Logger instance for logging messages.
+        :param metrics: Optional metrics registry for the sync duration and node counts.
         """
         self.interface = interface
         self.config = config
         self.nodesdb = nodesdb
-        self.freq = int(self.config.get('sync_frequency',43200))
-        self.status = False
+        self.logging = logging
 
-    def run(self):
-        """
-        Run the dbsync process to periodically update the local database with the device's node information.
-        This method runs in a loop, checking the device's nodes and updating the local database every `freq` seconds.
-        """
-        self.status = True
-        counter = 0
-        while self.status:
-            if counter>self.freq:
-                nodeQ = Query()
-                # updare the local db with the device db
-                for node in self.interface.nodes.values():
-                    user = node.get('user', {})
-                    self.nodesdb.upsert({
-                        'num': node.get('num'),
-                        'id': user.get('id',''),
-                        'longName': user.get('longName',''),
-                        'shortName': user.get('shortName',''),
-                        'macaddr': user.get('macaddr',''),
-                        'hwModel': user.get('hwModel','')
-                    }, nodeQ.num == node.get('num'))
-                counter=0
-            counter += 1
-            time.sleep(1)
+        self._sync_seconds = None
+        self._sync_nodes = None
+        if metrics is not None:
+            self._sync_seconds = metrics.histogram('mesh_dbsync_seconds',
+                                                   'Time to sync the device node list to the database')
+            self._sync_nodes = metrics.gauge('mesh_dbsync_nodes',
+                                             'Nodes added, changed and unchanged by the last sync', ('result',))
 
-    def stop(self):
+    def interval(self):
         """
-        Stop the dbsync process.
-        This method sets the status to False, which will break the loop in the run method.
+        Return the seconds between two scheduled syncs ('sync_frequency').
+        The job scheduler calls now() every interval.
         """
-        self.status = False
+        return int(self.config.get('sync_frequency',43200))
 
     def now(self):
         """
         Immediately update the local database with the current device node information.
         This method is useful for manually triggering an update without waiting for the next scheduled sync.
+        Only new nodes and nodes whose fields differ from the stored record are written,
+        all of them in a single batch.
+        :return: Dict with the number of added, changed and unchanged nodes and the duration in ms.
+        """
+        start = time.perf_counter()
+        added = []
+        changed = []
+        unchanged = 0
+        # compare the device db with the local db
+        for node in list(self.interface.nodes.values()):
+            record = self._node_record(node)
+            stored = self.nodesdb.get(record['num'])
+            if stored is None:
+                added.append(record)
+            elif any(stored.get(key) != value for key, value in record.items()):
+                changed.append(record)
+            else:
+                unchanged += 1
+
+        if added or changed:
+            self.nodesdb.upsert_many(added + changed)
+
+        result = {
+            'added': len(added),
+            'changed': len(changed),
+            'unchanged': unchanged,
+            'duration_ms': (time.perf_counter() - start) * 1000
+        }
+        if self._sync_seconds is not None:
+            self._sync_seconds.observe(result['duration_ms'] / 1000)
+            for key in ('added', 'changed', 'unchanged'):
+                self._sync_nodes.set(result[key], result=key)
+        self.logging.info(f"Node sync: {result['added']} added, {result['changed']} changed, "
+                          f"{result['unchanged']} unchanged in {result['duration_ms']:.1f} ms")
+        return result
+
+    @staticmethod
+    def _node_record(node):
+        """
+        Build a local database record from a device node entry.
+        :param node: A node entry of interface.nodes.
+        :return: Node record dict.
         """
-        nodeQ = Query()
-        # updare the local db with the device db
-        for node in self.interface.nodes.values():
-            user = node.get('user', {})
-            self.nodesdb.upsert({
-                'num': node.get('num'),
-                'id': user.get('id',''),
-                'longName': user.get('longName',''),
-                'shortName': user.get('shortName',''),
-                'macaddr': user.get('macaddr',''),
-                'HarhwModel': user.get('hwModel','')
-            }, nodeQ.num == node.get('num'))
\ No newline at end of file
+        user = node.get('user', {})
+        return {
+            'num': node.get('num'),
+            'id': user.get('id',''),
+            'longName': user.get('longName',''),
+            'shortName': user.get('shortName',''),
+            'macaddr': user.get('macaddr',''),
+            'hwModel': user.get('hwModel','')
+        }
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+class seenpackets:
+    """
+    This class remembers recently received packets by (sender, packet id)
+    so copies of the same packet relayed by different nodes are handled
+    only once. Entries expire after 'dedup_ttl' seconds and the set never
+    holds more than 'dedup_size' packets (oldest dropped first).
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the seen-set.
+        :param config: The configuration object that contains the dedup settings.
+        """
+        self.config = config
+        self.ttl = int(self.config.get('dedup_ttl', 600))
+        self.size = max(1, int(self.config.get('dedup_size', 2048)))
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # (from, id) -> first seen (monotonic seconds), oldest first
+        self._hits = 0
+        self._misses = 0
+
+    def seen(self, packet):
+        """
+        Check a packet against the seen-set and remember it.
+        Packets without an id are never treated as duplicates.
+        :param packet: The packet dict from meshtastic.
+        :return: True if the packet is a duplicate of one seen within the TTL.
+        """
+        packet_id = packet.get('id')
+        if not packet_id:
+            return False
+        key = (packet.get('from'), packet_id)
+        now = time.monotonic()
+        with self._lock:
+            # expire old entries from the front, they are in insertion order
+            while self._seen:
+                first_seen = next(iter(self._seen.values()))
+                if now - first_seen < self.ttl:
+                    break
+                self._seen.popitem(last=False)
+
+            if key in self._seen:
+                self._hits += 1
+                return True
+            self._misses += 1
+            self._seen[key] = now
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return False
+
+    def stats(self):
+        """
+        Return the dedup counters.
+        :return: Dict with the number of tracked packets, duplicate hits and misses.
+        """
+        with self._lock:
+            return {
+                'tracked': len(self._seen),
+                'hits': self._hits,
+                'misses': self._misses
+            }
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+class lastheard:
+    """
+    This class keeps the last heard time of every node in an OrderedDict:
+    a node that is heard again is moved to the end. Pipeline workers can
+    record nodes slightly out of time order, so next to its heard time every
+    entry keeps a sort key that never decreases along the dict (the heard
+    time, or the previous tail's key when that is later). Finding the nodes
+    heard in the last N seconds walks the dict backwards and stops at the
+    first entry whose key is older, so the cost depends only on the number
+    of active nodes, not on the size of the activity log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heard = OrderedDict()  # node num -> (last heard, sort key) in epoch seconds, oldest key first
+
+    def touch(self, num, heard=None):
+        """
+        Record that a node was heard.
+        Times may arrive out of order, an older time than the known one is ignored.
+        :param num: The node number.
+        :param heard: Time heard in epoch seconds, defaults to now.
+        """
+        heard = time.time() if heard is None else heard
+        with self._lock:
+            previous = self._heard.get(num)
+            if previous is not None and previous[0] > heard:
+                return
+            key = heard
+            if self._heard:
+                key = max(key, self._heard[next(reversed(self._heard))][1])
+            self._heard[num] = (heard, key)
+            self._heard.move_to_end(num)
+
+    def get(self, num):
+        """
+        Return the last heard time of a node.
+        :param num: The node number.
+        :return: Epoch seconds or None if the node was never heard.
+        """
+        with self._lock:
+            entry = self._heard.get(num)
+            return entry[0] if entry is not None else None
+
+    def active(self, seconds):
+        """
+        Return the nodes heard in the last given number of seconds.
+        :param seconds: Size of the window in seconds.
+        :return: List of node numbers, most recently recorded first.
+        """
+        cutoff = time.time() - seconds
+        nums = []
+        with self._lock:
+            for num in reversed(self._heard):
+                heard, key = self._heard[num]
+                # heard is never later than key, so no active node is behind this one
+                if key < cutoff:
+                    break
+                if heard >= cutoff:
+                    nums.append(num)
+        return nums
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heard)
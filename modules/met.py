@@ -5,16 +5,31 @@ import busio
 import adafruit_ahtx0
 import adafruit_bmp280
 
+import modules.metStats as metStats
+
 class METService:
     """
     This class handles the reading of temperature, humidity, and pressure
     from AHT20 and BMP280 sensors. It updates the shared state with the
     latest readings in a thread-safe manner.
+    With 'met_oversample' above 1 the sensors are read several times per
+    'met_interval' and the readings are combined without outliers.
     It supports dynamic enabling/disabling via the 'met_on' config flag.
+    'status' is True while the sensors are initialized.
     """
 
-    def __init__(self, logging, shared_data, config):
+    def __init__(self, logging, shared_data, config, metlog=None):
+        """
+        Initialize the MET service.
+        :param logging: Logger instance for logging messages.
+        :param shared_data: Shared state that receives the latest readings.
+        :param config: The configuration object that contains the MET settings.
+        :param metlog: Optional MET log the samples are appended to.
+        """
         self.shared_data = shared_data
+        self.metlog = metlog
+        self.stats = metStats.metstats(config)
+        self._reads = []  # sensor reads of the current interval
         self.logging = logging
         self.config = config
         self.status = False
@@ -58,72 +73,94 @@ class METService:
         self.bmp280 = None
         self.i2c = None
 
-    def start(self):
-        """Start the MET reading loop."""
-        self.status = True
-        sensors_initialized = False
-
-        while self.status:
-            met_on = self.config.get("met_on", "Disabled") == "Enabled"
-
-            if met_on and not sensors_initialized:
-                sensors_initialized = self._init_sensors()
-            elif not met_on and sensors_initialized:
-                self._cleanup_sensors()
-                sensors_initialized = False
-            # Skip reading if MET is disabled or sensors not initialized
-            if not met_on or not sensors_initialized:
-                time.sleep(1)
-                continue
-
-            # Read sensor data safely
-            try:
-                t_aht = self.aht20.temperature
-                rh = self.aht20.relative_humidity
-                t_bmp = self.bmp280.temperature
-                p_station = self.bmp280.pressure
-
-                p_sea = self._sea_level_pressure_hpa(
-                    p_station,
-                    t_aht,
-                    int(self.config.get("altitude", 0))
-                )
-
-                self.shared_data.set_metdata(
-                    temp1=t_aht,
-                    temp2=t_bmp,
-                    pressure_station=p_station,
-                    pressure_sea=p_sea,
-                    humidity=rh
-                )
-
-                # Log MET data to file in JSON lines format for graphing
-                try:
-                    import json
-                    log_path = "logs/met_data.jsonl"
-                    entry = {
-                        "timestamp": int(time.time()),
-                        "temp1": t_aht,
-                        "temp2": t_bmp,
-                        "pressure_station": p_station,
-                        "pressure_sea": p_sea,
-                        "humidity": rh
-                    }
-                    with open(log_path, "a") as f:
-                        f.write(json.dumps(entry) + "\n")
-                except Exception as log_exc:
-                    self.logging.error(f"Failed to log MET data: {log_exc}")
-
-                if self.config.get("met_logging", "Disabled") == "Enabled":
-                    self.logging.info(f"AHT20 Temp: {t_aht:.2f} °C Humidity: {rh:.1f}%")
-                    self.logging.info(f"BMP280 Temp: {t_bmp:.2f} °C Station Pressure: {p_station:.2f} hPa Sea-level: {p_sea:.2f} hPa")
-            except Exception as e:
-                self.logging.error(f"Error reading MET sensors: {e}")
-
-            time.sleep(int(self.config.get("met_interval", 60)))
+    def interval(self):
+        """
+        Return the seconds between two sensor reads: 'met_interval' divided
+        by the 'met_oversample' reads that are combined into one sample.
+        """
+        return int(self.config.get("met_interval", 60)) / self._oversample()
+
+    def _oversample(self):
+        return max(1, int(self.config.get("met_oversample", 1)))
+
+    def sample(self):
+        """
+        Read the sensors once. Every 'met_oversample' reads the readings
+        are combined, without outliers, into one sample that updates the
+        shared state, the rolling statistics and the MET log.
+        The job scheduler calls this every interval(). The sensors are
+        initialized when 'met_on' is enabled and released when it is disabled.
+        """
+        met_on = self.config.get("met_on", "Disabled") == "Enabled"
+
+        if met_on and not self.status:
+            self.status = self._init_sensors()
+        elif not met_on and self.status:
+            self._cleanup_sensors()
+            self.status = False
+        # Skip reading if MET is disabled or sensors not initialized
+        if not met_on or not self.status:
+            self._reads = []
+            return
+
+        # Read sensor data safely
+        try:
+            self._reads.append({
+                'temp1': self.aht20.temperature,
+                'humidity': self.aht20.relative_humidity,
+                'temp2': self.bmp280.temperature,
+                'pressure_station': self.bmp280.pressure
+            })
+        except Exception as e:
+            self.logging.error(f"Error reading MET sensors: {e}")
+            return
+        if len(self._reads) < self._oversample():
+            return
+
+        reads, self._reads = self._reads, []
+        values = {}
+        for field in ('temp1', 'temp2', 'humidity', 'pressure_station'):
+            values[field], dropped = metStats.filter_outliers([read[field] for read in reads],
+                                                              metStats.LIMITS.get(field),
+                                                              metStats.NOISE.get(field, 0.0))
+            if dropped:
+                self.logging.debug(f"Dropped {dropped} of {len(reads)} {field} readings as outliers")
+        if None in values.values():
+            self.logging.error("No valid MET readings in this interval")
+            return
+        t_aht = values['temp1']
+        rh = values['humidity']
+        t_bmp = values['temp2']
+        p_station = values['pressure_station']
+
+        p_sea = self._sea_level_pressure_hpa(
+            p_station,
+            t_aht,
+            int(self.config.get("altitude", 0))
+        )
+        values['pressure_sea'] = p_sea
+
+        now = time.time()
+        self.stats.add(now, values)
+        self.shared_data.set_metdata(
+            temp1=t_aht,
+            temp2=t_bmp,
+            pressure_station=p_station,
+            pressure_sea=p_sea,
+            humidity=rh,
+            stats=self.stats.summary(now)
+        )
+
+        # Log MET data for graphing, the log writes in batches
+        if self.metlog is not None:
+            self.metlog.append(now, **values)
+
+        if self.config.get("met_logging", "Disabled") == "Enabled":
+            self.logging.info(f"AHT20 Temp: {t_aht:.2f} °C Humidity: {rh:.1f}%")
+            self.logging.info(f"BMP280 Temp: {t_bmp:.2f} °C Station Pressure: {p_station:.2f} hPa Sea-level: {p_sea:.2f} hPa")
 
     def stop(self):
-        """Stop the MET reading loop and cleanup sensors."""
+        """Release the sensors."""
         self.status = False
         self._cleanup_sensors()
 
@@ -0,0 +1,423 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+FIELDS = ('temp1', 'temp2', 'pressure_station', 'pressure_sea', 'humidity')
+
+# Binary records: uint32 epoch seconds followed by the FIELDS as float32, little endian
+RECORD = struct.Struct('<I5f')
+MAGIC = b'METLOG1\n'
+
+# Sidecar index of the JSON lines files: uint32 epoch seconds and uint64 byte offset of a line
+INDEX = struct.Struct('<IQ')
+
+EXTENSIONS = {'jsonl': 'jsonl', 'binary': 'bin'}
+_FILE_RE = re.compile(r'^met-(\d{8})(?:\.(\d+))?\.(jsonl|bin)$')
+
+def lttb(times, values, threshold):
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets, which keeps
+    the points that shape the line (peaks, dips, steps) instead of averaging them away.
+    :param times: List of x values in ascending order.
+    :param values: List of y values.
+    :param threshold: Number of points to return (at least 3).
+    :return: Tuple (times, values) of the selected points.
+    """
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return list(times), list(values)
+    out_t = [times[0]]
+    out_v = [values[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_t = sum(times[next_start:next_end]) / count
+        avg_v = sum(values[next_start:next_end]) / count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        at, av = times[a], values[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((at - avg_t) * (values[j] - av) - (at - times[j]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        out_t.append(times[best])
+        out_v.append(values[best])
+        a = best
+    out_t.append(times[-1])
+    out_v.append(values[-1])
+    return out_t, out_v
+
+class metlog:
+    """
+    This class logs the MET samples for the weather page.
+    Samples are kept in memory and appended to the log in batches of
+    'met_log_batch' samples (or after 'met_log_flush' seconds), so the SD
+    card sees one write per batch instead of an open/append/close per sample.
+    Files are rotated per UTC day and when they reach 'met_log_max_kb',
+    e.g. logs/met/met-20250101.jsonl, met-20250101.1.jsonl, and files older
+    than 'met_log_days' days are removed.
+    'met_log_format' selects JSON lines or fixed-width binary records
+    (RECORD, 24 bytes per sample after the MAGIC header); read() handles both.
+    Every 'met_log_index_every' lines of a JSON lines file the timestamp and
+    byte offset are appended to a sidecar '<file>.idx', so a range read
+    binary-searches the index and starts streaming from the memory-mapped
+    file near the first requested sample. Binary files need no index, their
+    fixed-width records are binary-searched directly.
+    """
+
+    def __init__(self, config=None, logging=None, path='logs/met'):
+        """
+        Initialize the MET log.
+        :param config: The configuration object that contains the log settings.
+        :param logging: Logger instance for logging messages.
+        :param path: Directory of the log files.
+        """
+        self.config = config
+        self.logging = logging
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer = []       # samples not written yet
+        self._first = None      # monotonic time of the oldest buffered sample
+        self._file = None       # (day, part, extension) of the file being appended
+        self._pruned = None     # day the old files were last removed
+        self._index = (None, 0)  # (path, lines written since its last index entry)
+        self.written = 0
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, timestamp, **values):
+        """
+        Add a sample, writing the buffer when the batch is full.
+        :param timestamp: Epoch seconds of the sample.
+        :param values: The FIELDS values; missing ones are stored as None.
+        """
+        sample = {'timestamp': int(timestamp)}
+        for field in FIELDS:
+            value = values.get(field)
+            sample[field] = None if value is None else float(value)
+        with self._lock:
+            self._buffer.append(sample)
+            if self._first is None:
+                self._first = time.monotonic()
+            batch = int(self.config.get('met_log_batch', 10))
+            age = time.monotonic() - self._first
+            if len(self._buffer) >= batch or age >= int(self.config.get('met_log_flush', 600)):
+                self._flush()
+
+    def flush(self):
+        """Write the buffered samples."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Write the buffered samples before shutdown."""
+        self.flush()
+
+    def _flush(self):
+        """Write the buffer to the current file. Must be called with the lock held."""
+        if not self._buffer:
+            return
+        fmt = self.config.get('met_log_format', 'jsonl')
+        extension = EXTENSIONS.get(fmt, 'jsonl')
+        try:
+            # a batch may cross midnight, every sample goes to the file of its own day
+            start = 0
+            while start < len(self._buffer):
+                day = self._day(self._buffer[start]['timestamp'])
+                end = start
+                while end < len(self._buffer) and self._day(self._buffer[end]['timestamp']) == day:
+                    end += 1
+                self._write(day, extension, self._buffer[start:end])
+                start = end
+        except OSError as e:
+            self.logging.error(f"Failed to write the MET log: {e}")
+            return
+        self.written += len(self._buffer)
+        self._buffer = []
+        self._first = None
+        self._prune()
+
+    def _write(self, day, extension, samples):
+        """Append samples of one day, rotating the file when it is full."""
+        path = self._current(day, extension)
+        if extension == 'bin':
+            with open(path, 'ab') as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(b''.join(self._pack(sample) for sample in samples))
+        else:
+            every = max(1, int(self.config.get('met_log_index_every', 64)))
+            # after a restart the first line written gets an index entry
+            since = self._index[1] if self._index[0] == path else every
+            lines = []
+            entries = []
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                for sample in samples:
+                    line = (json.dumps(sample, separators=(',', ':')) + "\n").encode('utf-8')
+                    if since >= every:
+                        entries.append(INDEX.pack(sample['timestamp'], offset))
+                        since = 0
+                    lines.append(line)
+                    offset += len(line)
+                    since += 1
+                f.write(b''.join(lines))
+            if entries:
+                with open(path + '.idx', 'ab') as f:
+                    f.write(b''.join(entries))
+            self._index = (path, since)
+
+    def _current(self, day, extension):
+        """Return the path to append to, starting a new part when the file reached the size limit."""
+        max_bytes = int(self.config.get('met_log_max_kb', 1024)) * 1024
+        if self._file is None or self._file[0] != day or self._file[2] != extension:
+            # continue with the last part written for this day, e.g. after a restart
+            parts = [part for d, part, ext, _ in self.files() if d == day and ext == extension]
+            self._file = (day, max(parts) if parts else 0, extension)
+        path = self._name(*self._file)
+        if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+            self._file = (day, self._file[1] + 1, extension)
+            path = self._name(*self._file)
+        return path
+
+    def _name(self, day, part, extension):
+        suffix = f".{part}" if part else ""
+        return os.path.join(self.path, f"met-{day}{suffix}.{extension}")
+
+    def _prune(self):
+        """Remove the files older than 'met_log_days', once per day."""
+        today = self._day(time.time())
+        if self._pruned == today:
+            return
+        self._pruned = today
+        keep = int(self.config.get('met_log_days', 365))
+        oldest = self._day(time.time() - keep * 86400)
+        for day, _, _, path in self.files():
+            if day < oldest:
+                try:
+                    os.remove(path)
+                    if os.path.exists(path + '.idx'):
+                        os.remove(path + '.idx')
+                    self.logging.info(f"Removed old MET log {path}")
+                except OSError as e:
+                    self.logging.warning(f"Failed to remove old MET log {path}: {e}")
+
+    @staticmethod
+    def _day(timestamp):
+        return time.strftime('%Y%m%d', time.gmtime(timestamp))
+
+    @staticmethod
+    def _pack(sample):
+        return RECORD.pack(sample['timestamp'],
+                           *(math.nan if sample[field] is None else sample[field] for field in FIELDS))
+
+    @staticmethod
+    def _unpack(record):
+        timestamp, *values = record
+        sample = {'timestamp': timestamp}
+        for field, value in zip(FIELDS, values):
+            sample[field] = None if math.isnan(value) else round(value, 2)
+        return sample
+
+    def import_legacy(self, path='logs/met_data.jsonl'):
+        """
+        Move the samples of the old single-file MET log into the day files
+        and rename it to '<path>.imported'.
+        The old log is not necessarily in time order, so its samples are
+        grouped per day as packed records and every day is sorted before
+        it is written.
+        :param path: Path of the old log.
+        """
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        days = {}  # day -> bytearray of RECORD packed samples
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    sample = {'timestamp': int(entry['timestamp'])}
+                    for field in FIELDS:
+                        value = entry.get(field)
+                        sample[field] = None if value is None else float(value)
+                    record = self._pack(sample)
+                except (ValueError, KeyError, TypeError, struct.error):
+                    continue
+                days.setdefault(self._day(sample['timestamp']), bytearray()).extend(record)
+                count += 1
+        with self._lock:
+            for day in sorted(days):
+                samples = [self._unpack(record) for record in RECORD.iter_unpack(days.pop(day))]
+                samples.sort(key=lambda sample: sample['timestamp'])
+                self._buffer.extend(samples)
+                self._flush()
+        os.replace(path, path + '.imported')
+        self.logging.info(f"Imported {count} samples from {path} into {self.path}")
+        return count
+
+    def files(self):
+        """
+        List the log files in time order.
+        :return: List of (day 'YYYYMMDD', part, extension, path).
+        """
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        result = []
+        for name in names:
+            match = _FILE_RE.match(name)
+            if match:
+                day, part, extension = match.groups()
+                result.append((day, int(part or 0), extension, os.path.join(self.path, name)))
+        result.sort()
+        return result
+
+    def read(self, start=None, end=None):
+        """
+        Read the samples of a time range, including the ones not written yet.
+        :param start: First epoch second, None for the start of the log.
+        :param end: Last epoch second, None for now.
+        :return: Generator of sample dicts in time order.
+        """
+        first_day = self._day(start) if start is not None else None
+        last_day = self._day(end) if end is not None else None
+        with self._lock:
+            pending = list(self._buffer)
+        days = {}
+        for day, _, extension, path in self.files():
+            # the file name tells the day, so whole files outside the range are skipped
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            days.setdefault(day, {}).setdefault(extension, []).append(path)
+        for day in sorted(days):
+            # the parts of one format follow each other, a format change mid-day is merged by time
+            streams = [self._read_files(paths, extension, start) for extension, paths in days[day].items()]
+            for sample in heapq.merge(*streams, key=lambda sample: sample['timestamp']):
+                if start is not None and sample['timestamp'] < start:
+                    continue
+                if end is not None and sample['timestamp'] > end:
+                    break
+                yield sample
+        for sample in pending:
+            if (start is None or sample['timestamp'] >= start) and (end is None or sample['timestamp'] <= end):
+                yield sample
+
+    def series(self, start=None, end=None, points=500, fields=FIELDS):
+        """
+        Read a time range as one downsampled series per field.
+        :param start: First epoch second, None for the start of the log.
+        :param end: Last epoch second, None for now.
+        :param points: Maximum number of points per series.
+        :param fields: The FIELDS to return.
+        :return: Tuple (number of samples read, dict field -> {'t': [...], 'v': [...]}).
+        """
+        raw = {field: ([], []) for field in fields}
+        count = 0
+        for sample in self.read(start, end):
+            count += 1
+            for field in fields:
+                value = sample.get(field)
+                if value is not None:
+                    raw[field][0].append(sample['timestamp'])
+                    raw[field][1].append(value)
+        result = {}
+        for field, (times, values) in raw.items():
+            times, values = lttb(times, values, points)
+            result[field] = {'t': times, 'v': [round(value, 2) for value in values]}
+        return count, result
+
+    def _read_files(self, paths, extension, start=None):
+        for path in paths:
+            yield from self._read_file(path, extension, start)
+
+    def _read_file(self, path, extension, start=None):
+        """
+        Read the samples of one log file from the memory-mapped file,
+        skipping damaged records.
+        :param start: Epoch second to seek to, None to read the whole file.
+        """
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if extension == 'bin':
+                        yield from self._read_records(path, mm, start)
+                    else:
+                        yield from self._read_lines(path, mm, start)
+        except OSError as e:
+            self.logging.warning(f"Failed to read the MET log {path}: {e}")
+
+    def _read_records(self, path, mm, start):
+        """Stream the fixed-width records, binary-searching the first one at or after start."""
+        if mm[:len(MAGIC)] != MAGIC:
+            self.logging.warning(f"{path} is not a MET log file")
+            return
+        # an interrupted write leaves a partial record at the end, it is ignored
+        count = (len(mm) - len(MAGIC)) // RECORD.size
+        first = 0
+        if start is not None:
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if struct.unpack_from('<I', mm, len(MAGIC) + mid * RECORD.size)[0] < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            first = lo
+        for i in range(first, count):
+            yield self._unpack(RECORD.unpack_from(mm, len(MAGIC) + i * RECORD.size))
+
+    def _read_lines(self, path, mm, start):
+        """Stream the JSON lines, starting at the last index entry before start."""
+        if start is not None:
+            mm.seek(self._seek(path + '.idx', start, len(mm)))
+        for line in iter(mm.readline, b''):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def _seek(self, index_path, start, size):
+        """
+        Find the byte offset to start reading a JSON lines file for a start time.
+        The memory-mapped index is binary-searched in place, entries pointing
+        at or beyond size (lines written after the file was mapped) are ignored.
+        :return: Offset of the last indexed line before start, 0 without an index.
+        """
+        try:
+            with open(index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < INDEX.size:
+                    return 0
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # the offsets grow with every entry, so the usable ones are a prefix
+                    lo, hi = 0, len(mm) // INDEX.size
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if INDEX.unpack_from(mm, mid * INDEX.size)[1] < size:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    # entries with the start time itself may have earlier lines with the same time
+                    lo, hi = 0, lo
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if INDEX.unpack_from(mm, mid * INDEX.size)[0] < start:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    return INDEX.unpack_from(mm, (lo - 1) * INDEX.size)[1] if lo else 0
+        except (OSError, ValueError):
+            return 0
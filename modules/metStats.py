@@ -0,0 +1,158 @@
+import math
+from array import array
+
+NAN = float('nan')
+
+FIELDS = ('temp1', 'temp2', 'humidity', 'pressure_station', 'pressure_sea')
+
+# Plausible ranges of the AHT20 and BMP280, readings outside them are dropped
+LIMITS = {
+    'temp1': (-40.0, 85.0),
+    'temp2': (-40.0, 85.0),
+    'humidity': (0.0, 100.0),
+    'pressure_station': (300.0, 1100.0),
+}
+
+TREND_SECONDS = 3 * 3600  # pressure tendency over 3 hours, as in synoptic reports
+
+# Pressure tendency names by change in hPa over 3 hours (UK Met Office terms)
+TENDENCIES = ((0.1, "steady"), (1.6, "slowly"), (3.6, ""), (6.0, "quickly"))
+
+# Least spread assumed for the readings of a sensor (about its noise), so a
+# few nearly equal readings do not make ordinary noise look like an outlier
+NOISE = {
+    'temp1': 0.2,
+    'temp2': 0.2,
+    'humidity': 1.0,
+    'pressure_station': 0.5,
+}
+
+MIN_READINGS = 5  # below this the median absolute deviation is too unstable to reject readings
+
+def filter_outliers(values, limit=None, noise=0.0, k=3.0):
+    """
+    Average repeated readings of a sensor, ignoring outliers.
+    Readings outside the plausible range are dropped first. With at least
+    MIN_READINGS readings, those further than k scaled median absolute
+    deviations (at least the sensor noise) from the median are dropped too.
+    :param values: List of readings.
+    :param limit: Optional (low, high) plausible range.
+    :param noise: Least deviation assumed for the sensor.
+    :param k: Rejection threshold in standard deviations.
+    :return: Tuple (mean of the kept readings or None, number of dropped readings).
+    """
+    kept = [v for v in values if v is not None and not math.isnan(v)
+            and (limit is None or limit[0] <= v <= limit[1])]
+    if len(kept) >= MIN_READINGS:
+        ordered = sorted(kept)
+        median = ordered[len(ordered) // 2] if len(ordered) % 2 else \
+            (ordered[len(ordered) // 2 - 1] + ordered[len(ordered) // 2]) / 2
+        deviations = sorted(abs(v - median) for v in kept)
+        mad = max(deviations[len(deviations) // 2] * 1.4826, noise)
+        if mad > 0:
+            kept = [v for v in kept if abs(v - median) <= k * mad]
+        else:
+            # most readings are equal, the others are outliers
+            kept = [v for v in kept if v == median] or kept
+    if not kept:
+        return None, len(values)
+    return sum(kept) / len(kept), len(values) - len(kept)
+
+def tendency(change):
+    """
+    Describe a 3 hour pressure change, e.g. 'rising slowly' or 'steady'.
+    :param change: Change in hPa over 3 hours.
+    """
+    direction = "rising" if change > 0 else "falling"
+    for limit, name in TENDENCIES:
+        if abs(change) < limit:
+            if name == "steady":
+                return name
+            return f"{direction} {name}".strip()
+    return f"{direction} very rapidly"
+
+class metstats:
+    """
+    This class keeps the recent MET samples in fixed-size ring buffers
+    ('met_stats_size' samples, one preallocated array per field) and
+    computes rolling min/max/mean over 'met_stats_window' seconds and the
+    3 hour pressure tendency.
+    It is only used from the MET sampling job, the results are published
+    to the shared state as one snapshot.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the buffers.
+        :param config: The configuration object that contains the buffer size and window.
+        """
+        self.config = config
+        self.size = max(2, int(self.config.get('met_stats_size', 2880)))
+        self.times = array('d', [0.0]) * self.size
+        self.values = {field: array('f', [NAN]) * self.size for field in FIELDS}
+        self.pos = 0     # next slot to write
+        self.count = 0   # number of valid samples
+
+    def add(self, timestamp, values):
+        """
+        Add a sample.
+        :param timestamp: Epoch seconds of the sample.
+        :param values: Dict of field -> value, missing or None values are stored as NaN.
+        """
+        self.times[self.pos] = timestamp
+        for field in FIELDS:
+            value = values.get(field)
+            self.values[field][self.pos] = NAN if value is None else value
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _indexes(self):
+        """Slot indexes of the valid samples, oldest first."""
+        start = (self.pos - self.count) % self.size
+        return [(start + i) % self.size for i in range(self.count)]
+
+    def summary(self, now):
+        """
+        Compute the rolling statistics.
+        :param now: Epoch seconds of the latest sample.
+        :return: Dict with '<field>_min', '<field>_max', '<field>_mean' for
+                 each field, 'pressure_trend' (hPa over 3 hours) and
+                 'pressure_tendency'; values are None without data.
+        """
+        window = int(self.config.get('met_stats_window', 86400))
+        indexes = [i for i in self._indexes() if self.times[i] >= now - window]
+        result = {}
+        for field in FIELDS:
+            column = self.values[field]
+            values = [column[i] for i in indexes if not math.isnan(column[i])]
+            result[f"{field}_min"] = round(min(values), 2) if values else None
+            result[f"{field}_max"] = round(max(values), 2) if values else None
+            result[f"{field}_mean"] = round(sum(values) / len(values), 2) if values else None
+        result['pressure_trend'] = None
+        result['pressure_tendency'] = None
+        trend = self._trend(now)
+        if trend is not None:
+            result['pressure_trend'] = round(trend, 1)
+            result['pressure_tendency'] = tendency(trend)
+        return result
+
+    def _trend(self, now):
+        """
+        Change of the sea-level pressure over the last 3 hours, from the
+        latest sample at least TREND_SECONDS old.
+        :return: Change in hPa, None while the history is shorter than 3 hours.
+        """
+        column = self.values['pressure_sea']
+        reference = None
+        latest = None
+        for i in self._indexes():
+            if math.isnan(column[i]):
+                continue
+            if self.times[i] <= now - TREND_SECONDS:
+                reference = i
+            latest = i
+        if reference is None or latest is None or self.times[latest] <= self.times[reference]:
+            return None
+        change = column[latest] - column[reference]
+        # scale to exactly 3 hours when the reference sample is older
+        return change * TREND_SECONDS / (self.times[latest] - self.times[reference])
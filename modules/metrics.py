@@ -0,0 +1,213 @@
+import bisect
+import threading
+
+# histogram buckets in seconds, suited to handler and database latencies
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _escape_help(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class _metric:
+    """
+    Base class of the metric types.
+    Values are kept per tuple of label values. A metric can also read its
+    values from a function at scrape time with set_function(), so counters
+    a component already keeps do not have to be updated twice.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._function = None
+        if not self.labels:
+            # a metric without labels is reported from the start
+            self._values[()] = self._zero()
+
+    def _zero(self):
+        return 0
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def set_function(self, function):
+        """
+        Read the values from a function when the metrics are rendered.
+        :param function: Callable returning a number for a metric without
+                         labels, or a dict of label value tuple -> number.
+        """
+        self._function = function
+
+    def samples(self):
+        """
+        Return the samples of the metric.
+        :return: List of (name suffix, label pairs, value).
+        """
+        if self._function is not None:
+            values = self._function()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [('', list(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+class counter(_metric):
+    """A value that only goes up, e.g. the number of packets received."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter.
+        :param amount: Amount to add, must not be negative.
+        :param labels: Value for each label of the metric.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class gauge(_metric):
+    """A value that goes up and down, e.g. a queue depth."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        """
+        Set the gauge.
+        :param value: The new value.
+        :param labels: Value for each label of the metric.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class histogram(_metric):
+    """
+    Counts observations, e.g. latencies, in cumulative buckets and keeps
+    their sum and count.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _zero(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def set_function(self, function):
+        raise TypeError("histograms can not be read from a function")
+
+    def observe(self, value, **labels):
+        """
+        Record an observation.
+        :param value: The observed value, in seconds for latencies.
+        :param labels: Value for each label of the metric.
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = self._zero()
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        samples = []
+        for key, (counts, total, count) in sorted(values.items()):
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', pairs + [('le', _format_value(float(bound)))], cumulative))
+            samples.append(('_sum', pairs, total))
+            samples.append(('_count', pairs, count))
+        return samples
+
+class metricsregistry:
+    """
+    This class holds the in-process metrics and renders them in the
+    Prometheus text exposition format for the '/metrics' route.
+    Asking for a metric that already exists returns the existing one, so
+    components can register their metrics every time they are created.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help='', labels=()):
+        """Return the counter with this name, creating it if needed."""
+        return self._get(counter, name, help, labels)
+
+    def gauge(self, name, help='', labels=()):
+        """Return the gauge with this name, creating it if needed."""
+        return self._get(gauge, name, help, labels)
+
+    def histogram(self, name, help='', labels=(), buckets=DEFAULT_BUCKETS):
+        """Return the histogram with this name, creating it if needed."""
+        return self._get(histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format.
+        :return: The exposition text.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                lines.append(f"# {metric.name} failed: {_escape_help(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, pairs, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -5,6 +5,32 @@ import pytz
 import time
 from datetime import datetime,timedelta
 
+# NMEA sentence types used, all others are dropped before parsing
+SENTENCES = frozenset((b'GGA', b'GSA', b'GSV', b'VTG', b'ZDA', b'TXT'))
+READ_CHUNK = 4096   # largest serial read in bytes
+MAX_LINE = 256      # NMEA sentences are at most 82 characters
+STATS_SECONDS = 10  # period of the sentence rate statistics
+
+def nmea_checksum_ok(line, star):
+    """
+    Verify the checksum of an NMEA sentence: the XOR of the bytes between
+    '$' and '*' as two hex digits after the '*'.
+    The bytes are XORed as one integer folded in halves, a few integer
+    operations instead of one Python step per byte.
+    :param line: The sentence as bytes.
+    :param star: Index of the '*' in the line.
+    """
+    size = star - 1
+    checksum = int.from_bytes(line[1:star], 'little')
+    while size > 1:
+        half = (size + 1) // 2
+        checksum = (checksum & ((1 << (half * 8)) - 1)) ^ (checksum >> (half * 8))
+        size = half
+    try:
+        return checksum == int(line[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
 class mygps:
     """
     This class handles reading and parsing NMEA sentences from a GPS module
@@ -39,7 +65,7 @@ class mygps:
         local_tz = pytz.timezone(tz_name)
         return utc_dt.astimezone(local_tz)
 
-    def __init__(self, logging, shared_data, config):
+    def __init__(self, logging, shared_data, config, metrics=None):
         """
         Initialize the GPS reader.
         Args:
@@ -49,6 +75,7 @@ class mygps:
             logging: Logger instance for logging messages.
             shared_data: Shared data object to store GPS data.
             config: Configuration dictionary.
+            metrics: Optional metrics registry for the sentence counters.
         """
         self.shared_data = shared_data
         self.logging = logging
@@ -70,6 +97,16 @@ class mygps:
         self.gps_track = {} #true_course, magnetic_course, ppeed_kts, speed_kmh
         self.gps_status = "No info"
 
+        # sentence counters: parsed, ignored type, bad checksum, parse error, bytes read
+        self._counts = {'ok': 0, 'ignored': 0, 'checksum': 0, 'parse': 0, 'bytes': 0}
+        self._stats_counts = dict(self._counts)
+        self._stats_time = time.monotonic()
+        self.stats = {}
+        if metrics is not None:
+            metrics.counter('mesh_gps_sentences_total', 'NMEA sentences read from the GPS by result',
+                            ('result',)).set_function(
+                lambda: {(key,): value for key, value in self._counts.items() if key != 'bytes'})
+
     def _init_sensor(self):
         """
         Initialize the GPS sensor by opening the serial port.
@@ -101,6 +138,8 @@ class mygps:
     def start(self):
         """
         Main loop to read and parse NMEA sentences from the GPS module.
+        The serial port is read in chunks of whatever has arrived and split
+        into lines here instead of one readline() call per sentence.
         """
         self.status = True
         sensors_initialized = False
@@ -120,111 +159,173 @@ class mygps:
             
             # Read and parse NMEA sentences
             try:
+                buffer = b''
                 while gps_on:
-                    line = self.ser.readline().decode('ascii', errors='replace').strip()
-                    if line.startswith("$"):
-                        try:
-                            data = pynmea2.parse(line)
-                        except pynmea2.ParseError as e:
-                            self.logging.warning(f"Failed to parse NMEA sentence: {line}, error: {e}")
-                            continue
-                        match data.sentence_type:
-                            case "GGA":
-                                # Convert latitude/longitude to signed decimal
-                                lat = float(data.latitude)
-                                if data.lat_dir == "S":
-                                    lat = -lat
-                                lon = float(data.longitude)
-                                if data.lon_dir == "W":
-                                    lon = -lon
-                                # Update gps_pos dictionary
-                                self.gps_pos = {
-                                    "latitude": lat,
-                                    "longitude": lon,
-                                    "altitude": float(data.altitude) if data.altitude else None,
-                                    "altitude_units": data.altitude_units,
-                                    "fix_quality": data.gps_qual,
-                                    "num_sats": data.num_sats,
-                                    "hdop": data.horizontal_dil,
-                                    "geoid_sep": data.geo_sep,
-                                    "geoid_units": data.geo_sep_units,
-                                    "system": data.talker,  # 'GP', 'GL', 'GA', 'BD', etc.
-                                }
-                                self.shared_data.set_gps_pos(value = self.gps_pos)
-                            case "GSA":
-                                # Update gps_fix status and satellites_in_fix dictionary
-                                if data.mode_fix_type != '1':  # '1' means no fix
-                                    self.gps_fix = True
-                                    # Ensure the talker key exists
-                                    talker = data.talker
-                                    if talker not in self.satellites_in_fix:
-                                        self.satellites_in_fix[talker] = {}
-                                    # Clear previous satellites for this fix
-                                    self.satellites_in_fix[talker] = {}
-                                    # Iterate over SV ID fields dynamically
-                                    sv_fields = [attr for label, attr in data.fields if attr.startswith('sv_id')]
-                                    # Collect satellites from this sentence
-                                    for attr in sv_fields:
-                                        prn = getattr(data, attr, None)
-                                        if prn:  # skip empty slots
-                                            # Store in the dict under talker
-                                            self.satellites_in_fix[talker][prn] = {
-                                                "prn": prn,
-                                            }
-                                else:
-                                    self.gps_fix = False
-                                    # Clear previous fix if no valid fix
-                                    self.satellites_in_fix[data.talker] = {}
-                                # You can also store PDOP, HDOP, VDOP if needed -not used for now
-                                PDOP = data.pdop
-                                HDOP = data.hdop
-                                VDOP = data.vdop
-                                self.shared_data.set_gps_fix(value= self.gps_fix)
-                                self.shared_data.set_satellites_in_fix(value = self.satellites_in_fix)
-                            case "GSV":
-                                talker = data.talker  # e.g. "GP", "GA", "GL", "BD"
-                                # Ensure talker key exists
-                                if talker not in self.satellites_in_view or data.msg_num == 1:
-                                    # New cycle or first time we’ve seen this talker
-                                    self.satellites_in_view[talker] = {}
-                                # Collect satellites from this sentence
-                                for i in range(1, 5):
-                                    prn  = getattr(data, f'sv_prn_num_{i}', None)
-                                    elev = getattr(data, f'elevation_deg_{i}', None)
-                                    azim = getattr(data, f'azimuth_{i}', None)
-                                    snr  = getattr(data, f'snr_{i}', None)
-                                    if prn:
-                                        sat_info = {
-                                            "prn": prn,
-                                            "elevation": elev,
-                                            "azimuth": azim,
-                                            "snr": snr,
-                                        }
-                                        self.satellites_in_view[talker][prn] = sat_info
-                                self.shared_data.set_satellites_in_view(value = self.satellites_in_view)
-                            case "VTG":
-                                #update gps_track dictionary
-                                self.gps_track = {
-                                    "true_course": float(data.true_track) if data.true_track else None,
-                                    "magnetic_course": float(data.mag_track) if data.mag_track else None,
-                                    "speed_kts": float(data.spd_over_grnd_kts) if data.spd_over_grnd_kts else None,
-                                    "speed_kmh": float(data.spd_over_grnd_kmph) if data.spd_over_grnd_kmph else None,
-                                }
-                                self.shared_data.set_gps_track(value= self.gps_track)
-                            case "ZDA":
-                                gps_time = datetime.combine(data.datestamp, data.timestamp)
-                                corrected_datetime = self._correct_date(dt=gps_time)
-                                self.gps_time = f"{self._convert_timezone(dt=corrected_datetime).strftime('%Y-%m-%d %H:%M:%S')} ({self.TZ_NAME})"
-                                self.shared_data.set_gps_time(value = self.gps_time)
-                            case "TXT":
-                                self.gps_status = data.text
-                                self.shared_data.set_gps_status(value = self.gps_status)
+                    # blocks up to the timeout for the first byte, then takes everything waiting
+                    chunk = self.ser.read(min(READ_CHUNK, max(1, self.ser.in_waiting)))
+                    if chunk:
+                        self._counts['bytes'] += len(chunk)
+                        lines = (buffer + chunk).split(b'\n')
+                        buffer = lines.pop()
+                        if len(buffer) > MAX_LINE:
+                            # no line end in sight, e.g. a wrong baud rate
+                            self._counts['checksum'] += 1
+                            buffer = b''
+                        for line in lines:
+                            self._process(line.strip())
+                    self._update_stats()
                     gps_on = self.config.get("gps_on", "Disabled") == "Enabled"               
             except serial.SerialException as e:
                 self.logging.error(f"Serial error while reading GPS data: {e}")
                 self._cleanup_sensor()
                 sensors_initialized = False
-        
+
+    def _process(self, line):
+        """
+        Check one NMEA line and parse it if it is a sentence we use.
+        The sentence type and the checksum are checked on the raw bytes, so
+        ignored or damaged sentences never reach pynmea2.
+        :param line: The line as bytes, without the line end.
+        """
+        # '$' + two character talker + three character sentence type
+        if len(line) < 7 or line[0] != 0x24:
+            return
+        if line[3:6] not in SENTENCES:
+            self._counts['ignored'] += 1
+            return
+        star = line.rfind(b'*')
+        if star < 0 or not nmea_checksum_ok(line, star):
+            self._counts['checksum'] += 1
+            return
+        try:
+            # the checksum is already verified, pynmea2 gets the sentence without it
+            data = pynmea2.parse(line[:star].decode('ascii'))
+            self._handle(data)
+        except (ValueError, TypeError, AttributeError, UnicodeDecodeError) as e:
+            # pynmea2.ParseError is a ValueError
+            self._counts['parse'] += 1
+            self.logging.debug(f"Failed to parse NMEA sentence: {line!r}, error: {e}")
+            return
+        self._counts['ok'] += 1
+
+    def _handle(self, data):
+        """
+        Update the GPS state from a parsed sentence.
+        :param data: The pynmea2 sentence object.
+        """
+        match data.sentence_type:
+            case "GGA":
+                # Convert latitude/longitude to signed decimal
+                lat = float(data.latitude)
+                if data.lat_dir == "S":
+                    lat = -lat
+                lon = float(data.longitude)
+                if data.lon_dir == "W":
+                    lon = -lon
+                # Update gps_pos dictionary
+                self.gps_pos = {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "altitude": float(data.altitude) if data.altitude else None,
+                    "altitude_units": data.altitude_units,
+                    "fix_quality": data.gps_qual,
+                    "num_sats": data.num_sats,
+                    "hdop": data.horizontal_dil,
+                    "geoid_sep": data.geo_sep,
+                    "geoid_units": data.geo_sep_units,
+                    "system": data.talker,  # 'GP', 'GL', 'GA', 'BD', etc.
+                }
+                self.shared_data.set_gps_pos(value = self.gps_pos)
+            case "GSA":
+                # Update gps_fix status and satellites_in_fix dictionary
+                if data.mode_fix_type != '1':  # '1' means no fix
+                    self.gps_fix = True
+                    # Ensure the talker key exists
+                    talker = data.talker
+                    if talker not in self.satellites_in_fix:
+                        self.satellites_in_fix[talker] = {}
+                    # Clear previous satellites for this fix
+                    self.satellites_in_fix[talker] = {}
+                    # SV ID fields 1-12 follow mode and fix type; read from the field list,
+                    # pynmea2 attribute lookups are slow
+                    for prn in data.data[2:14]:
+                        if prn:  # skip empty slots
+                            # Store in the dict under talker
+                            self.satellites_in_fix[talker][prn] = {
+                                "prn": prn,
+                            }
+                else:
+                    self.gps_fix = False
+                    # Clear previous fix if no valid fix
+                    self.satellites_in_fix[data.talker] = {}
+                # PDOP, HDOP and VDOP are in data.data[14:17] if needed - not used for now
+                self.shared_data.set_gps_fix(value= self.gps_fix)
+                self.shared_data.set_satellites_in_fix(value = self.satellites_in_fix)
+            case "GSV":
+                talker = data.talker  # e.g. "GP", "GA", "GL", "BD"
+                # Ensure talker key exists
+                # the fields are strings, msg_num '1' starts a new cycle
+                if talker not in self.satellites_in_view or data.data[1] == '1':
+                    # New cycle or first time we’ve seen this talker
+                    self.satellites_in_view[talker] = {}
+                # Collect the up to 4 satellites of this sentence (prn, elevation, azimuth, snr)
+                fields = data.data
+                for i in range(3, len(fields) - 3, 4):
+                    prn, elev, azim, snr = fields[i:i + 4]
+                    if prn:
+                        sat_info = {
+                            "prn": prn,
+                            "elevation": elev,
+                            "azimuth": azim,
+                            "snr": snr,
+                        }
+                        self.satellites_in_view[talker][prn] = sat_info
+                self.shared_data.set_satellites_in_view(value = self.satellites_in_view)
+            case "VTG":
+                #update gps_track dictionary
+                self.gps_track = {
+                    "true_course": float(data.true_track) if data.true_track else None,
+                    "magnetic_course": float(data.mag_track) if data.mag_track else None,
+                    "speed_kts": float(data.spd_over_grnd_kts) if data.spd_over_grnd_kts else None,
+                    "speed_kmh": float(data.spd_over_grnd_kmph) if data.spd_over_grnd_kmph else None,
+                }
+                self.shared_data.set_gps_track(value= self.gps_track)
+            case "ZDA":
+                gps_time = datetime.combine(data.datestamp, data.timestamp)
+                corrected_datetime = self._correct_date(dt=gps_time)
+                self.gps_time = f"{self._convert_timezone(dt=corrected_datetime).strftime('%Y-%m-%d %H:%M:%S')} ({self.TZ_NAME})"
+                self.shared_data.set_gps_time(value = self.gps_time)
+            case "TXT":
+                self.gps_status = data.text
+                self.shared_data.set_gps_status(value = self.gps_status)
+
+    def _update_stats(self):
+        """
+        Compute the sentence rate and error rate every STATS_SECONDS and
+        publish them to the shared state.
+        """
+        now = time.monotonic()
+        elapsed = now - self._stats_time
+        if elapsed < STATS_SECONDS:
+            return
+        delta = {key: self._counts[key] - self._stats_counts.get(key, 0) for key in self._counts}
+        errors = delta['checksum'] + delta['parse']
+        checked = delta['ok'] + errors
+        self.stats = {
+            'sentences_per_s': round(delta['ok'] / elapsed, 1),
+            'ignored_per_s': round(delta['ignored'] / elapsed, 1),
+            'bytes_per_s': round(delta['bytes'] / elapsed),
+            'error_rate': round(errors / checked, 4) if checked else 0.0,
+            'checksum_errors': self._counts['checksum'],
+            'parse_errors': self._counts['parse']
+        }
+        if errors:
+            self.logging.warning(f"GPS: {delta['checksum']} checksum and {delta['parse']} parse errors "
+                                 f"in {checked} sentences over {elapsed:.0f} s")
+        self.shared_data.set_gps_stats(value=self.stats)
+        self._stats_counts = dict(self._counts)
+        self._stats_time = now
+
     def stop(self):
         """
         Stop the GPS reading loop and cleanup resources.
@@ -0,0 +1,178 @@
+import threading
+
+class noderegistry:
+    """
+    This class keeps the node records of the tinydb 'Nodes' table in memory,
+    indexed by node number and node id, so lookups and upserts do not scan
+    the table. The tinydb table remains the persistent store; writes go
+    through to it using the document id of each node.
+    """
+
+    def __init__(self, db=None, nodesdb=None):
+        """
+        Load all node records from the database into the in-memory index.
+        :param db: The TinyDB instance, opened with a CachingMiddleware storage.
+        :param nodesdb: The tinydb table where node information is stored.
+        """
+        self.db = db
+        self.nodesdb = nodesdb
+        self._lock = threading.Lock()
+        self._by_num = {}   # node num -> node record
+        self._by_id = {}    # node id -> node num
+        self._doc_ids = {}  # node num -> tinydb document id
+
+        duplicates = []
+        for doc in self.nodesdb.all():
+            num = doc.get('num')
+            if num in self._doc_ids:
+                # keep the newest document of a node that was stored twice
+                duplicates.append(self._doc_ids[num])
+            self._doc_ids[num] = doc.doc_id
+            self._by_num[num] = dict(doc)
+            if doc.get('id'):
+                self._by_id[doc['id']] = num
+        if duplicates:
+            self.nodesdb.remove(doc_ids=duplicates)
+            self.db.storage.flush()
+
+    def get(self, num):
+        """
+        Return the node record for a node number.
+        :param num: The node number.
+        :return: A copy of the node record or None if the node is unknown.
+        """
+        with self._lock:
+            record = self._by_num.get(num)
+            return dict(record) if record is not None else None
+
+    def get_by_id(self, node_id):
+        """
+        Return the node record for a node id such as '!a1b2c3d4'.
+        :param node_id: The node id.
+        :return: A copy of the node record or None if the node is unknown.
+        """
+        with self._lock:
+            num = self._by_id.get(node_id)
+            if num is None:
+                return None
+            return dict(self._by_num[num])
+
+    def all(self):
+        """Return a copy of every node record."""
+        with self._lock:
+            return [dict(record) for record in self._by_num.values()]
+
+    def page(self, num=None, node_id=None, search=None, sort='num', order='asc',
+             cursor=None, limit=100):
+        """
+        Return one page of node records using keyset pagination.
+        :param num: Only the node with this node number.
+        :param node_id: Only the node with this node id.
+        :param search: Only nodes whose long or short name contains this text.
+        :param sort: Field to sort by: 'num', 'id', 'longName', 'shortName' or 'hwModel'.
+        :param order: 'asc' or 'desc'.
+        :param cursor: The cursor returned with the previous page, or None.
+        :param limit: Maximum number of records in the page.
+        :return: Tuple (records, next_cursor); next_cursor is None on the last page.
+        """
+        if sort not in ('num', 'id', 'longName', 'shortName', 'hwModel'):
+            sort = 'num'
+        if cursor is not None and not self._valid_cursor(cursor, sort):
+            # e.g. a cursor of another sort field, start at the first page
+            cursor = None
+        with self._lock:
+            if num is not None:
+                candidates = [self._by_num[num]] if num in self._by_num else []
+            elif node_id is not None:
+                candidates = [self._by_num[self._by_id[node_id]]] if node_id in self._by_id else []
+            else:
+                candidates = list(self._by_num.values())
+            if search:
+                search = search.lower()
+                candidates = [record for record in candidates
+                              if search in str(record.get('longName', '')).lower()
+                              or search in str(record.get('shortName', '')).lower()]
+
+            # sort on (field, num) so the cursor is unique even for equal field values
+            def sort_key(record):
+                num = record.get('num') or 0
+                return (num, num) if sort == 'num' else (str(record.get(sort, '')), num)
+
+            keyed = [(sort_key(record), record) for record in candidates]
+            if cursor is not None:
+                cursor = tuple(cursor)
+                if order == 'desc':
+                    keyed = [item for item in keyed if item[0] < cursor]
+                else:
+                    keyed = [item for item in keyed if item[0] > cursor]
+            keyed.sort(key=lambda item: item[0], reverse=(order == 'desc'))
+            records = [dict(record) for _, record in keyed[:limit]]
+
+        next_cursor = None
+        if len(keyed) > limit:
+            next_cursor = list(keyed[limit - 1][0])
+        return records, next_cursor
+
+    @staticmethod
+    def _valid_cursor(cursor, sort):
+        """Check that a cursor has the (field, num) shape of the sort field."""
+        if not isinstance(cursor, (list, tuple)) or len(cursor) != 2:
+            return False
+        value, num = cursor
+        if not isinstance(num, int) or isinstance(num, bool):
+            return False
+        if sort == 'num':
+            return isinstance(value, int) and not isinstance(value, bool)
+        return isinstance(value, str)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_num)
+
+    def upsert(self, record):
+        """
+        Insert or update a single node record by its 'num'.
+        :param record: Node record dict.
+        """
+        self.upsert_many([record])
+
+    def upsert_many(self, records):
+        """
+        Insert or update several node records by their 'num' and write them
+        to the tinydb table in one pass.
+        :param records: Iterable of node record dicts.
+        """
+        updated = {}
+        inserted = {}
+        with self._lock:
+            for record in records:
+                if 'id' in record and record['id'] is None:
+                    # a missing id is not a change of id
+                    record = {key: value for key, value in record.items() if key != 'id'}
+                num = record.get('num')
+                current = self._by_num.get(num)
+                if current is None:
+                    self._by_num[num] = dict(record)
+                    inserted[num] = dict(record)
+                else:
+                    old_id = current.get('id')
+                    if old_id and 'id' in record and old_id != record['id']:
+                        self._by_id.pop(old_id, None)
+                    current.update(record)
+                    if num in self._doc_ids:
+                        # a node can appear several times in one batch, its changes are merged
+                        updated.setdefault(num, {}).update(record)
+                    else:
+                        inserted[num] = dict(current)
+                if record.get('id'):
+                    self._by_id[record['id']] = num
+
+            if updated:
+                self.nodesdb.update(lambda doc: doc.update(updated[doc['num']]),
+                                    doc_ids=[self._doc_ids[num] for num in updated])
+            if inserted:
+                doc_ids = self.nodesdb.insert_multiple(inserted.values())
+                for num, doc_id in zip(inserted, doc_ids):
+                    self._doc_ids[num] = doc_id
+            if updated or inserted:
+                self.db.storage.flush()
@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+
+class pipeline:
+    """
+    This class decouples packet reception from packet handling.
+    The meshtastic reader thread only puts packets into a bounded queue;
+    a pool of worker threads takes them out and dispatches them to the
+    handler registered for their portnum.
+    When the queue is full the 'ingest_drop_policy' decides what happens:
+      - drop_oldest: discard the oldest queued packet to make room (default)
+      - drop_newest: discard the packet that just arrived
+      - block: wait up to one second for room, then discard the new packet
+    """
+
+    DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+    def __init__(self, config=None, logging=None, metrics=None):
+        """
+        Initialize the ingestion pipeline.
+        :param config: The configuration object that contains the queue and worker settings.
+        :param logging: Logger instance for logging messages.
+        :param metrics: Optional metrics registry for the per-portnum latencies.
+        """
+        self.config = config
+        self.logging = logging
+        self.workers = max(1, int(self.config.get('ingest_workers', 2)))
+        self.policy = self.config.get('ingest_drop_policy', 'drop_oldest')
+        if self.policy not in self.DROP_POLICIES:
+            self.policy = 'drop_oldest'
+        self.status = False
+
+        self._queue = queue.Queue(maxsize=max(1, int(self.config.get('ingest_queue_size', 256))))
+        self._handlers = {}
+        self._default_handler = None
+        self._threads = []
+
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._dropped = 0
+        self._portnums = {}  # portnum -> latency counters
+
+        self._wait_seconds = None
+        self._handle_seconds = None
+        if metrics is not None:
+            self._wait_seconds = metrics.histogram('mesh_packet_queue_wait_seconds',
+                                                   'Time a packet waited in the ingest queue', ('portnum',))
+            self._handle_seconds = metrics.histogram('mesh_packet_handler_seconds',
+                                                     'Time spent in the packet handler', ('portnum',))
+            metrics.gauge('mesh_ingest_queue_depth',
+                          'Packets waiting in the ingest queue').set_function(self._queue.qsize)
+            metrics.counter('mesh_ingest_dropped_total',
+                            'Packets dropped because the ingest queue was full').set_function(lambda: self._dropped)
+
+    def register(self, portnum, handler):
+        """
+        Register the handler for a portnum.
+        :param portnum: The portnum name, e.g. 'TEXT_MESSAGE_APP'.
+        :param handler: Callable taking (packet, interface).
+        """
+        self._handlers[portnum] = handler
+
+    def register_default(self, handler):
+        """
+        Register the handler for packets without a dedicated handler.
+        :param handler: Callable taking (packet, interface).
+        """
+        self._default_handler = handler
+
+    def submit(self, packet, interface):
+        """
+        Queue a received packet for the workers. Never blocks longer than
+        the 'block' drop policy allows.
+        :param packet: The packet dict from meshtastic.
+        :param interface: The interface the packet was received on.
+        :return: True if the packet was queued, False if it was dropped.
+        """
+        item = (time.perf_counter(), packet, interface)
+        with self._stats_lock:
+            self._submitted += 1
+        try:
+            if self.policy == 'block':
+                self._queue.put(item, timeout=1)
+            else:
+                self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == 'drop_oldest':
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait(item)
+                queued = True
+            except (queue.Empty, queue.Full):
+                queued = False
+        else:
+            queued = False
+        with self._stats_lock:
+            self._dropped += 1
+        self.logging.warning(f"Ingest queue full, dropped a packet ({self.policy})")
+        return queued
+
+    def start(self):
+        """Start the worker threads."""
+        self.status = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work,
+                                      name=f"ingest-{i}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """
+        Stop the worker threads and wait for the packets being handled.
+        Packets still in the queue are discarded.
+        :param timeout: Seconds to wait for each worker to finish.
+        """
+        self.status = False
+        for thread in self._threads:
+            thread.join(timeout)
+            if thread.is_alive():
+                self.logging.warning(f"{thread.name} did not stop within {timeout} seconds")
+        self._threads = []
+
+    def _work(self):
+        """Worker loop: take packets from the queue and run their handler."""
+        while self.status:
+            try:
+                queued_at, packet, interface = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            started = time.perf_counter()
+            portnum = packet.get('decoded', {}).get('portnum', 'UNKNOWN')
+            handler = self._handlers.get(portnum, self._default_handler)
+            try:
+                if handler is not None:
+                    handler(packet, interface)
+            except Exception as e:
+                self.logging.warning(f"Error parsing packet: {e}")
+            finished = time.perf_counter()
+            self._record(portnum, (started - queued_at) * 1000, (finished - started) * 1000)
+
+    def _record(self, portnum, wait_ms, handle_ms):
+        """Update the latency counters of a portnum."""
+        if self._wait_seconds is not None:
+            self._wait_seconds.observe(wait_ms / 1000, portnum=portnum)
+            self._handle_seconds.observe(handle_ms / 1000, portnum=portnum)
+        with self._stats_lock:
+            entry = self._portnums.setdefault(portnum, {
+                'count': 0,
+                'wait_ms_total': 0.0,
+                'wait_ms_max': 0.0,
+                'handle_ms_total': 0.0,
+                'handle_ms_max': 0.0
+            })
+            entry['count'] += 1
+            entry['wait_ms_total'] += wait_ms
+            entry['wait_ms_max'] = max(entry['wait_ms_max'], wait_ms)
+            entry['handle_ms_total'] += handle_ms
+            entry['handle_ms_max'] = max(entry['handle_ms_max'], handle_ms)
+
+    def stats(self):
+        """
+        Return the pipeline counters.
+        :return: Dict with queue depth, submitted/dropped counts and, per portnum,
+                 the packet count and average/max queue wait and handler time in ms.
+        """
+        with self._stats_lock:
+            portnums = {
+                portnum: {
+                    'count': entry['count'],
+                    'avg_wait_ms': entry['wait_ms_total'] / entry['count'],
+                    'max_wait_ms': entry['wait_ms_max'],
+                    'avg_handle_ms': entry['handle_ms_total'] / entry['count'],
+                    'max_handle_ms': entry['handle_ms_max']
+                } for portnum, entry in self._portnums.items()
+            }
+            return {
+                'queue_depth': self._queue.qsize(),
+                'submitted': self._submitted,
+                'dropped': self._dropped,
+                'portnums': portnums
+            }
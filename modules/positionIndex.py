@@ -0,0 +1,159 @@
+import math
+import threading
+
+from tools.general import EARTH_RADIUS_KM, haversine
+
+class positionindex:
+    """
+    This class keeps the latest position of every node in a grid of
+    latitude/longitude cells, so nearest-node and within-radius queries
+    only look at the cells around the query point instead of every node.
+    The positions themselves are stored with the node records; the index
+    is rebuilt from them on start.
+    """
+
+    def __init__(self, cell_km=10.0):
+        """
+        Initialize an empty index.
+        :param cell_km: Height of a grid cell in kilometers.
+        """
+        self.cell_km = max(0.1, float(cell_km))
+        self._cell_deg = self.cell_km / (math.pi * EARTH_RADIUS_KM / 180)
+        self._lock = threading.Lock()
+        self._positions = {}  # node num -> (lat, lon)
+        self._cells = {}      # (lat cell, lon cell) -> set of node nums
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg))
+
+    def update(self, num, lat, lon):
+        """
+        Set the position of a node, moving it to its new cell.
+        :param num: The node number.
+        :param lat: Latitude in degrees.
+        :param lon: Longitude in degrees.
+        """
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._positions.get(num)
+            if previous is not None:
+                old_cell = self._cell(*previous)
+                if old_cell != cell:
+                    self._discard(num, old_cell)
+            self._positions[num] = (lat, lon)
+            self._cells.setdefault(cell, set()).add(num)
+
+    def remove(self, num):
+        """
+        Remove a node from the index.
+        :param num: The node number.
+        """
+        with self._lock:
+            previous = self._positions.pop(num, None)
+            if previous is not None:
+                self._discard(num, self._cell(*previous))
+
+    def _discard(self, num, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(num)
+            if not members:
+                del self._cells[cell]
+
+    def get(self, num):
+        """
+        Return the position of a node.
+        :param num: The node number.
+        :return: Tuple (lat, lon) or None if the node has no position.
+        """
+        with self._lock:
+            return self._positions.get(num)
+
+    def within(self, lat, lon, radius_km, exclude=None):
+        """
+        Return the nodes within a radius of a point.
+        :param lat: Latitude of the point in degrees.
+        :param lon: Longitude of the point in degrees.
+        :param radius_km: Search radius in kilometers.
+        :param exclude: Node number left out of the result, e.g. the asking node.
+        :return: List of (node num, distance in km), nearest first.
+        """
+        with self._lock:
+            candidates = self._candidates(lat, lon, radius_km)
+            nums = [num for num in candidates if num != exclude]
+            points = [self._positions[num] for num in nums]
+        if not nums:
+            return []
+        lats, lons = zip(*points)
+        distances = haversine(lat, lon, lats, lons)
+        result = [(num, float(distance)) for num, distance in zip(nums, distances) if distance <= radius_km]
+        result.sort(key=lambda item: item[1])
+        return result
+
+    def nearest(self, lat, lon, k=5, exclude=None):
+        """
+        Return the k nodes nearest to a point.
+        The search radius starts at one cell and doubles until k nodes are
+        found or every node has been looked at.
+        :param lat: Latitude of the point in degrees.
+        :param lon: Longitude of the point in degrees.
+        :param k: Number of nodes to return.
+        :param exclude: Node number left out of the result, e.g. the asking node.
+        :return: List of (node num, distance in km), nearest first.
+        """
+        radius = self.cell_km
+        while True:
+            result = self.within(lat, lon, radius, exclude=exclude)
+            if len(result) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return result[:k]
+            radius *= 2
+
+    def _candidates(self, lat, lon, radius_km):
+        """
+        Collect the nodes in the cells that overlap a circle.
+        Must be called with the lock held.
+        """
+        lat_span = radius_km / (math.pi * EARTH_RADIUS_KM / 180)
+        lat_min = max(-90.0, lat - lat_span)
+        lat_max = min(90.0, lat + lat_span)
+        # the longitude span widens towards the poles
+        widest = max(abs(lat_min), abs(lat_max))
+        cos_lat = math.cos(math.radians(widest))
+        lat_cells = (math.floor(lat_min / self._cell_deg), math.floor(lat_max / self._cell_deg))
+        lon_ranges = None
+        if widest < 89.9 and lat_span / cos_lat < 180:
+            lon_span = lat_span / cos_lat
+            lon_min, lon_max = lon - lon_span, lon + lon_span
+            # split a box that crosses the antimeridian in two
+            if lon_min < -180:
+                lon_ranges = [(lon_min + 360, 180.0), (-180.0, lon_max)]
+            elif lon_max > 180:
+                lon_ranges = [(lon_min, 180.0), (-180.0, lon_max - 360)]
+            else:
+                lon_ranges = [(lon_min, lon_max)]
+            lon_ranges = [(math.floor(low / self._cell_deg), math.floor(high / self._cell_deg))
+                          for low, high in lon_ranges]
+
+        if lon_ranges is not None:
+            rows = lat_cells[1] - lat_cells[0] + 1
+            cell_count = sum(rows * (high - low + 1) for low, high in lon_ranges)
+        if lon_ranges is None or cell_count > len(self._cells):
+            # cheaper to look at the occupied cells than at every cell of the box
+            nums = set()
+            for (lat_cell, _), members in self._cells.items():
+                if lat_cells[0] <= lat_cell <= lat_cells[1]:
+                    nums.update(members)
+            return nums
+
+        nums = set()
+        for lat_cell in range(lat_cells[0], lat_cells[1] + 1):
+            for low, high in lon_ranges:
+                for lon_cell in range(low, high + 1):
+                    members = self._cells.get((lat_cell, lon_cell))
+                    if members:
+                        nums.update(members)
+        return nums
+
+    def __len__(self):
+        with self._lock:
+            return len(self._positions)
@@ -0,0 +1,200 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+class scheduler:
+    """
+    This class runs the periodic jobs (beacon, node sync, MET sampling,
+    activity compaction) from a single thread.
+    Jobs are kept in a heap ordered by their next due time and the thread
+    sleeps until the first one is due, instead of every job polling once
+    a second. The interval of a job is read again after every run, and a
+    job can name the config keys it depends on so a config change
+    reschedules it right away.
+    """
+
+    def __init__(self, logging=None):
+        """
+        Initialize the scheduler.
+        :param logging: Logger instance for logging messages.
+        """
+        self.logging = logging
+        self.status = False
+        self._cond = threading.Condition()
+        self._heap = []   # (due monotonic seconds, seq, name, version)
+        self._seq = itertools.count()
+        self._jobs = {}   # name -> job dict
+
+    def add(self, name, func, interval, delay=None, watch=()):
+        """
+        Add (or replace) a periodic job.
+        :param name: Unique name of the job.
+        :param func: Callable run without arguments when the job is due.
+        :param interval: Seconds between runs, or a callable returning them.
+        :param delay: Seconds until the first run, defaults to one interval.
+        :param watch: Config keys whose change reschedules the job.
+        """
+        job = {
+            'func': func,
+            'interval': interval if callable(interval) else (lambda: interval),
+            'watch': set(watch),
+            'version': 0,
+            'due': None,
+            'runs': 0,
+            'errors': 0,
+            'last_ms': 0.0
+        }
+        with self._cond:
+            previous = self._jobs.get(name)
+            if previous is not None:
+                job['version'] = previous['version'] + 1
+            self._jobs[name] = job
+            self._schedule(name, self._interval(job) if delay is None else delay)
+
+    def remove(self, name):
+        """
+        Remove a job; its queued heap entry is skipped when it comes up.
+        :param name: Name of the job.
+        """
+        with self._cond:
+            self._jobs.pop(name, None)
+            self._cond.notify()
+
+    def reschedule(self, name, delay=None):
+        """
+        Move the next run of a job.
+        :param name: Name of the job.
+        :param delay: Seconds from now, defaults to one interval.
+        """
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                return
+            job['version'] += 1
+            self._schedule(name, self._interval(job) if delay is None else delay)
+
+    def config_changed(self, keys):
+        """
+        Reschedule the jobs that watch any of the changed config keys.
+        :param keys: Iterable of config keys that changed.
+        """
+        keys = set(keys)
+        with self._cond:
+            names = [name for name, job in self._jobs.items() if job['watch'] & keys]
+        for name in names:
+            self.reschedule(name)
+            self.logging.info(f"Rescheduled {name} after a config change")
+
+    def next_run(self, name):
+        """
+        Return the seconds until a job runs next.
+        :param name: Name of the job.
+        :return: Seconds (never negative), or None if the job is unknown.
+        """
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None or job['due'] is None:
+                return None
+            return max(0, int(round(job['due'] - time.monotonic())))
+
+    def run(self):
+        """
+        Run the jobs as they come due until stop() is called.
+        A job is scheduled again one interval after its due time, so the
+        time a job takes does not make its period drift. Runs that were due
+        while the thread was busy are skipped, the job keeps its time grid.
+        """
+        self.status = True
+        while self.status:
+            with self._cond:
+                name, job = self._next_due()
+                if job is None:
+                    continue
+            started = time.perf_counter()
+            try:
+                job['func']()
+            except Exception as e:
+                job['errors'] += 1
+                self.logging.error(f"Scheduled job {name} failed: {e}")
+            job['runs'] += 1
+            job['last_ms'] = (time.perf_counter() - started) * 1000
+            with self._cond:
+                # the job may have been removed, replaced or rescheduled while it ran
+                if self._jobs.get(name) is job and job['due'] is None:
+                    interval = self._interval(job)
+                    now = time.monotonic()
+                    due = job['last_due'] + interval
+                    if due <= now:
+                        # periods missed while the thread was busy are skipped, not run back to back
+                        missed = math.floor((now - due) / interval) + 1
+                        due += missed * interval
+                        self.logging.debug(f"Scheduled job {name} skipped {missed} missed runs")
+                    self._schedule(name, due - now)
+
+    def _next_due(self):
+        """
+        Wait for the first due job and take it off the heap.
+        Must be called with the condition held.
+        :return: Tuple (name, job), job is None when the wait ended early.
+        """
+        while self._heap:
+            due, _, name, version = self._heap[0]
+            job = self._jobs.get(name)
+            if job is None or job['version'] != version:
+                heapq.heappop(self._heap)  # stale entry
+                continue
+            wait = due - time.monotonic()
+            if wait > 0:
+                self._cond.wait(timeout=wait)
+                return None, None
+            heapq.heappop(self._heap)
+            job['last_due'] = due
+            job['due'] = None
+            return name, job
+        self._cond.wait(timeout=60)
+        return None, None
+
+    def stop(self):
+        """Stop the scheduler loop after the running job returns."""
+        with self._cond:
+            self.status = False
+            self._cond.notify_all()
+
+    def _schedule(self, name, delay):
+        """
+        Push the next run of a job. Must be called with the condition held.
+        """
+        job = self._jobs[name]
+        job['due'] = time.monotonic() + delay
+        heapq.heappush(self._heap, (job['due'], next(self._seq), name, job['version']))
+        self._cond.notify()
+
+    def _interval(self, job):
+        try:
+            return max(1.0, float(job['interval']()))
+        except Exception as e:
+            self.logging.error(f"Invalid job interval, using 60 seconds: {e}")
+            return 60.0
+
+    def stats(self):
+        """
+        Return the job counters.
+        :return: Dict of job name -> seconds to the next run, runs, errors and
+                 duration of the last run in ms.
+        """
+        with self._cond:
+            names = list(self._jobs)
+        result = {}
+        for name in names:
+            job = self._jobs.get(name)
+            if job is None:
+                continue
+            result[name] = {
+                'next_run_s': self.next_run(name),
+                'runs': job['runs'],
+                'errors': job['errors'],
+                'last_ms': job['last_ms']
+            }
+        return result
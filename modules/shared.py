@@ -2,14 +2,14 @@ import threading
 
 class SharedState:
     def __init__(self):
-        # Initialize general shared variables
-        self._counter = 0
-        # Initialize MET data variables
-        self._temp1 = 0.0
-        self._temp2 = 0.0
-        self._pressure_station = 0.0
-        self._pressure_sea = 0.0
-        self._humidity = 0.0
+        # Initialize MET data variables, replaced as one dict by set_metdata
+        self._metdata = {
+            'temp1': 0.0,
+            'temp2': 0.0,
+            'pressure_station': 0.0,
+            'pressure_sea': 0.0,
+            'humidity': 0.0
+        }
         # Initialize GPS related variables
         self.satellites_in_view = {}  # dict of talker -> dict of satellites
         self.satellites_in_fix = {}  # dict of talker -> dict of satellites
@@ -18,40 +18,38 @@ class SharedState:
         self.gps_pos = {} # latitude, longitude, altitude
         self.gps_track = {} #true_course, magnetic_course, ppeed_kts, speed_kmh
         self.gps_status = "No info" # GPS status message
+        self.gps_stats = {} # NMEA sentence rate and error rate
         # Meshtastic related variables
         self.messages = []
         # lock for thread safety
         self._lock = threading.Lock()
 
-    def get_counter(self):
-        """Thread-safe way to read the variable."""
-        with self._lock:
-            return self._counter
-        
-    def set_counter(self, value):
-        """Thread-safe way to write the variable."""
-        with self._lock:
-            self._counter = value
-   
     def get_metdata(self):
-        """Thread-safe way to read multiple variables."""
-        with self._lock:
-            return {
-                'temp1': self._temp1,
-                'temp2': self._temp2,
-                'pressure_station': self._pressure_station,
-                'pressure_sea': self._pressure_sea,
-                'humidity': self._humidity
-            }
+        """
+        Thread-safe way to read the latest MET data and its rolling statistics.
+        The data is replaced as a whole by set_metdata, so readers only hold
+        the lock to take the reference.
+        """
+        with self._lock:
+            metdata = self._metdata
+        return dict(metdata)
         
-    def set_metdata(self, temp1, temp2, pressure_station, pressure_sea, humidity):
-        """Thread-safe way to write multiple variables."""
-        with self._lock:
-            self._temp1 = temp1
-            self._temp2 = temp2
-            self._pressure_station = pressure_station
-            self._pressure_sea = pressure_sea
-            self._humidity = humidity
+    def set_metdata(self, temp1, temp2, pressure_station, pressure_sea, humidity, stats=None):
+        """
+        Thread-safe way to write the MET data.
+        :param stats: Optional rolling statistics, see modules/metStats.py.
+        """
+        metdata = {
+            'temp1': temp1,
+            'temp2': temp2,
+            'pressure_station': pressure_station,
+            'pressure_sea': pressure_sea,
+            'humidity': humidity
+        }
+        if stats:
+            metdata.update(stats)
+        with self._lock:
+            self._metdata = metdata
     
     def get_satellites_in_view(self):
         """
@@ -131,6 +129,16 @@ class SharedState:
         with self._lock:
             self.gps_status = value
     
+    def get_gps_stats(self):
+        """ Thread-safe way to read the gps_stats variable."""
+        with self._lock:
+            return self.gps_stats
+
+    def set_gps_stats(self, value={}):
+        """ Thread-safe way to write the gps_stats variable."""
+        with self._lock:
+            self.gps_stats = value
+
     def add_message(self, sender, text):
         self.messages.append({'from': sender, 'text': text})
 
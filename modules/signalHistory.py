@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+NAN = float('nan')
+
+class _ring:
+    """
+    Fixed-size signal samples of one node, stored column-wise in
+    preallocated arrays: heard time (float64), RSSI and SNR (float32).
+    """
+
+    __slots__ = ('times', 'rssi', 'snr', 'pos', 'count')
+
+    def __init__(self, size):
+        self.times = array('d', [0.0]) * size
+        self.rssi = array('f', [NAN]) * size
+        self.snr = array('f', [NAN]) * size
+        self.pos = 0     # next slot to write
+        self.count = 0   # number of valid samples
+
+    def add(self, heard, rssi, snr):
+        size = len(self.times)
+        self.times[self.pos] = heard
+        self.rssi[self.pos] = rssi
+        self.snr[self.pos] = snr
+        self.pos = (self.pos + 1) % size
+        self.count = min(self.count + 1, size)
+
+    def indexes(self):
+        """Slot indexes of the valid samples, oldest first."""
+        size = len(self.times)
+        start = (self.pos - self.count) % size
+        return [(start + i) % size for i in range(self.count)]
+
+class signalhistory:
+    """
+    This class keeps the RSSI and SNR of packets heard directly from each
+    node in a fixed-size ring buffer per node ('signal_history_size'
+    samples), so memory stays bounded however long the repeater runs.
+    At most 'signal_history_nodes' nodes are kept; the node heard least
+    recently is dropped first.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the signal history.
+        :param config: The configuration object that contains the history sizes.
+        """
+        self.config = config
+        self.size = max(1, int(self.config.get('signal_history_size', 720)))
+        self.max_nodes = max(1, int(self.config.get('signal_history_nodes', 500)))
+        self._lock = threading.Lock()
+        self._nodes = OrderedDict()  # node num -> _ring, least recently heard first
+
+    def add(self, num, rssi=None, snr=None, heard=None):
+        """
+        Add a signal sample of a node.
+        :param num: The node number.
+        :param rssi: Received signal strength in dBm, None if unknown.
+        :param snr: Signal to noise ratio in dB, None if unknown.
+        :param heard: Time heard in epoch seconds, defaults to now.
+        """
+        if rssi is None and snr is None:
+            return
+        heard = time.time() if heard is None else heard
+        with self._lock:
+            ring = self._nodes.get(num)
+            if ring is None:
+                ring = self._nodes[num] = _ring(self.size)
+                if len(self._nodes) > self.max_nodes:
+                    self._nodes.popitem(last=False)
+            else:
+                self._nodes.move_to_end(num)
+            ring.add(heard,
+                     NAN if rssi is None else rssi,
+                     NAN if snr is None else snr)
+
+    def add_packet(self, packet):
+        """
+        Add the signal of a received packet if it was heard directly from
+        its sender; for relayed packets the values belong to the last relay.
+        :param packet: The packet dict from meshtastic.
+        """
+        hop_start = packet.get('hopStart')
+        hop_limit = packet.get('hopLimit')
+        if hop_start is not None and hop_limit is not None and hop_start != hop_limit:
+            return
+        self.add(packet.get('from'), packet.get('rxRssi'), packet.get('rxSnr'))
+
+    def samples(self, num, since=None):
+        """
+        Return the raw samples of a node.
+        :param num: The node number.
+        :param since: Only samples heard at or after this epoch time.
+        :return: List of (heard, rssi, snr), oldest first; unknown values are None.
+        """
+        with self._lock:
+            ring = self._nodes.get(num)
+            if ring is None:
+                return []
+            rows = [(ring.times[i], ring.rssi[i], ring.snr[i]) for i in ring.indexes()]
+        return [(heard, self._value(rssi), self._value(snr))
+                for heard, rssi, snr in rows if since is None or heard >= since]
+
+    def summary(self, num, window=86400, bucket=3600, now=None):
+        """
+        Downsample the samples of a node to min/avg/max per time bucket.
+        :param num: The node number.
+        :param window: Length of the summarized period in seconds, ending now.
+        :param bucket: Length of one bucket in seconds.
+        :param now: End of the period in epoch seconds, defaults to now.
+        :return: List of dicts with 'start', 'count' and 'rssi'/'snr' dicts of
+                 min, avg and max (None when no value was reported), oldest first.
+        """
+        now = time.time() if now is None else now
+        bucket = max(1, int(bucket))
+        since = now - window
+        buckets = {}
+        for heard, rssi, snr in self.samples(num, since=since):
+            start = int(heard - heard % bucket)
+            entry = buckets.get(start)
+            if entry is None:
+                entry = buckets[start] = {'count': 0, 'rssi': [], 'snr': []}
+            entry['count'] += 1
+            if rssi is not None:
+                entry['rssi'].append(rssi)
+            if snr is not None:
+                entry['snr'].append(snr)
+        return [{'start': start,
+                 'count': entry['count'],
+                 'rssi': self._min_avg_max(entry['rssi']),
+                 'snr': self._min_avg_max(entry['snr'])}
+                for start, entry in sorted(buckets.items())]
+
+    def nodes(self):
+        """
+        Return the nodes with signal history.
+        :return: List of dicts with 'num', 'count', 'last_heard' and the last
+                 'rssi' and 'snr', most recently heard first.
+        """
+        result = []
+        with self._lock:
+            for num in reversed(self._nodes):
+                ring = self._nodes[num]
+                last = (ring.pos - 1) % self.size
+                result.append({
+                    'num': num,
+                    'count': ring.count,
+                    'last_heard': ring.times[last],
+                    'rssi': self._value(ring.rssi[last]),
+                    'snr': self._value(ring.snr[last])
+                })
+        return result
+
+    @staticmethod
+    def _value(value):
+        return None if math.isnan(value) else round(value, 2)
+
+    @staticmethod
+    def _min_avg_max(values):
+        if not values:
+            return {'min': None, 'avg': None, 'max': None}
+        return {'min': min(values), 'avg': round(sum(values) / len(values), 2), 'max': max(values)}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._nodes)
@@ -0,0 +1,263 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+import modules.airtime as airtime
+
+class transmitter:
+    """
+    This class is the single outbound path to the mesh.
+    Messages are queued by priority (emergency > command replies > beacon >
+    web chat) and sent one at a time by a worker thread that keeps a rolling
+    airtime ledger of what it sent.
+    The time on air of every message is predicted from the radio's modem
+    settings before it is sent. Emergency messages are always sent.
+    Command replies wait while they would push our own airtime over the
+    budget. Beacons and web chat are also deferred while the device's
+    'airUtilTx' plus their own predicted share would exceed the limit;
+    while they wait, a newer beacon replaces the queued one and web chat
+    messages to the same destination are merged.
+    """
+
+    EMERGENCY = 0
+    COMMAND = 1
+    BEACON = 2
+    WEBCHAT = 3
+    PRIORITY_NAMES = {EMERGENCY: 'emergency', COMMAND: 'command', BEACON: 'beacon', WEBCHAT: 'webchat'}
+
+    MAX_TEXT_BYTES = 200   # largest merged web chat message
+    DEFER_SECONDS = 5      # re-check interval while sends are deferred
+    AIRUTIL_CACHE_SECONDS = 10
+
+    def __init__(self, interface=None, config=None, logging=None, metrics=None):
+        """
+        Initialize the transmit scheduler.
+        :param interface: The interface object for the meshtastic unit.
+        :param config: The configuration object that contains the airtime settings.
+        :param logging: Logger instance for logging messages.
+        :param metrics: Optional metrics registry for the queue and airtime figures.
+        """
+        self.interface = interface
+        self.config = config
+        self.logging = logging
+        self.status = False
+        self.airtime = airtime.loraairtime(interface=interface,
+                                           config=config,
+                                           logging=logging)
+
+        self._cond = threading.Condition()
+        self._heap = []                 # (priority, seq, entry)
+        self._seq = itertools.count()
+        self._ledger = deque()          # (sent time, airtime seconds)
+        self._ledger_total = 0.0
+        self._last_send = 0.0
+        self._air_util = 0.0
+        self._air_util_read = 0.0
+
+        self._sent = {name: 0 for name in self.PRIORITY_NAMES.values()}
+        self._wait_total = {name: 0.0 for name in self.PRIORITY_NAMES.values()}
+        self._wait_max = {name: 0.0 for name in self.PRIORITY_NAMES.values()}
+        self._deferred = 0
+        self._coalesced = 0
+        self._errors = 0
+
+        if metrics is not None:
+            metrics.gauge('mesh_tx_queue_depth', 'Messages waiting to be sent',
+                          ('priority',)).set_function(
+                lambda: {(name,): count for name, count in self.stats()['queued'].items()})
+            metrics.counter('mesh_tx_sent_total', 'Messages sent',
+                            ('priority',)).set_function(
+                lambda: {(name,): count for name, count in self.stats()['sent'].items()})
+            metrics.counter('mesh_tx_deferred_total', 'Times every queued message was deferred').set_function(
+                lambda: self._deferred)
+            metrics.gauge('mesh_tx_airtime_percent', 'Own airtime over the rolling window in percent').set_function(
+                lambda: self.stats()['airtime_percent'])
+
+    def send(self, text, destinationId="^all", priority=COMMAND):
+        """
+        Queue a text message for transmission.
+        :param text: The message text.
+        :param destinationId: Node id or '^all' for a broadcast.
+        :param priority: One of EMERGENCY, COMMAND, BEACON or WEBCHAT.
+        """
+        with self._cond:
+            if not self._coalesce(text, destinationId, priority):
+                entry = {
+                    'text': text,
+                    'destinationId': destinationId,
+                    'priority': priority,
+                    'queued': time.monotonic()
+                }
+                heapq.heappush(self._heap, (priority, next(self._seq), entry))
+            self._cond.notify()
+
+    def _coalesce(self, text, destinationId, priority):
+        """
+        Merge a new low priority message into one that is still queued.
+        Must be called with the condition held.
+        :return: True if the message was merged and must not be queued.
+        """
+        for _, _, entry in self._heap:
+            if entry['priority'] != priority or entry['destinationId'] != destinationId:
+                continue
+            if priority == self.BEACON:
+                # only the newest beacon text is worth sending
+                entry['text'] = text
+                self._coalesced += 1
+                return True
+            if priority == self.WEBCHAT:
+                merged = entry['text'] + "\n" + text
+                if len(merged.encode('utf-8')) <= self.MAX_TEXT_BYTES:
+                    entry['text'] = merged
+                    self._coalesced += 1
+                    return True
+        return False
+
+    def run(self):
+        """
+        Run the transmit loop, sending the highest priority message that
+        fits the airtime budget until stop() is called.
+        """
+        self.status = True
+        while self.status:
+            with self._cond:
+                while self.status and not self._heap:
+                    self._cond.wait(timeout=1)
+                if not self.status:
+                    break
+                wait = self._next_send_delay()
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue
+                entry = self._pick()
+                if entry is None:
+                    self._deferred += 1
+                    self._cond.wait(timeout=self.DEFER_SECONDS)
+                    continue
+            self._transmit(entry)
+
+    def stop(self):
+        """
+        Stop the transmit loop.
+        Messages still in the queue are not sent.
+        """
+        with self._cond:
+            self.status = False
+            self._cond.notify_all()
+
+    def _next_send_delay(self):
+        """Seconds left of the minimum gap between two transmissions."""
+        gap = int(self.config.get('tx_min_gap_ms', 1000)) / 1000
+        return self._last_send + gap - time.monotonic()
+
+    def _pick(self):
+        """
+        Pop the highest priority message that may be sent now.
+        Must be called with the condition held.
+        :return: The message entry, or None if every queued message is deferred.
+        """
+        window = int(self.config.get('tx_airtime_window', 3600))
+        budget = float(self.config.get('tx_airtime_budget', 10.0)) / 100 * window
+        used = self.airtime_percent() / 100 * window
+        # airUtilTx is the device's own transmit share of the last hour
+        util_room = (float(self.config.get('tx_airutil_limit', 3.0)) - self.air_util()) / 100 * 3600
+        for item in sorted(self._heap):
+            priority, _, entry = item
+            if priority == self.EMERGENCY:
+                allowed = True
+            else:
+                predicted = self.estimate_airtime(entry['text'])
+                allowed = used + predicted <= budget
+                if priority != self.COMMAND:
+                    allowed = allowed and predicted <= util_room
+            if allowed:
+                self._heap.remove(item)
+                heapq.heapify(self._heap)
+                return entry
+        return None
+
+    def _transmit(self, entry):
+        """Send one message and record its airtime and queue wait."""
+        name = self.PRIORITY_NAMES[entry['priority']]
+        waited = time.monotonic() - entry['queued']
+        try:
+            self.logging.debug(f"Sending {name} message to {entry['destinationId']}: {entry['text']}")
+            self.interface.sendText(text=entry['text'], destinationId=entry['destinationId'])
+        except Exception as e:
+            self.logging.error(f"Failed to send {name} message: {e}")
+            with self._cond:
+                self._errors += 1
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._last_send = now
+            airtime = self.estimate_airtime(entry['text'])
+            self._ledger.append((now, airtime))
+            self._ledger_total += airtime
+            self._sent[name] += 1
+            self._wait_total[name] += waited
+            self._wait_max[name] = max(self._wait_max[name], waited)
+
+    def estimate_airtime(self, text):
+        """
+        Predict the time on air of a text message with the radio's modem settings.
+        :param text: The message text.
+        :return: Predicted airtime in seconds.
+        """
+        return self.airtime.estimate(text)
+
+    def airtime_percent(self):
+        """
+        Return our own airtime over the rolling 'tx_airtime_window' as a percentage.
+        """
+        window = int(self.config.get('tx_airtime_window', 3600))
+        now = time.monotonic()
+        while self._ledger and self._ledger[0][0] < now - window:
+            self._ledger_total -= self._ledger.popleft()[1]
+        return self._ledger_total / window * 100
+
+    def air_util(self):
+        """
+        Return the 'airUtilTx' device metric of the local node, re-read at
+        most every AIRUTIL_CACHE_SECONDS seconds.
+        """
+        now = time.monotonic()
+        if now - self._air_util_read >= self.AIRUTIL_CACHE_SECONDS:
+            self._air_util_read = now
+            try:
+                my_node_num = self.interface.localNode.nodeNum
+                local_node = self.interface.nodes.get('!' + hex(my_node_num)[2:], {})
+                duty_cycle = local_node.get("deviceMetrics", {}).get("airUtilTx")
+                self._air_util = float(duty_cycle) if duty_cycle is not None else 0.0
+            except Exception as e:
+                self.logging.warning(f"Failed to read airUtilTx: {e}")
+        return self._air_util
+
+    def stats(self):
+        """
+        Return the transmit counters.
+        :return: Dict with queue depth per priority, sent counts, average and
+                 maximum queue wait in seconds, deferrals, merged messages,
+                 own airtime percentage, the device airUtilTx and the modem
+                 settings used for the airtime predictions.
+        """
+        with self._cond:
+            depth = {name: 0 for name in self.PRIORITY_NAMES.values()}
+            for priority, _, _ in self._heap:
+                depth[self.PRIORITY_NAMES[priority]] += 1
+            return {
+                'queue_depth': len(self._heap),
+                'queued': depth,
+                'sent': dict(self._sent),
+                'avg_wait_s': {name: (self._wait_total[name] / self._sent[name]) if self._sent[name] else 0.0
+                               for name in self._sent},
+                'max_wait_s': dict(self._wait_max),
+                'deferred': self._deferred,
+                'coalesced': self._coalesced,
+                'errors': self._errors,
+                'airtime_percent': self.airtime_percent(),
+                'air_util_tx': self._air_util,
+                'modem': self.airtime.modem()
+            }
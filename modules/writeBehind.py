@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+
+_STOP = object()  # queued by stop() to wake the write-behind loop
+
+class writebehind:
+    """
+    This class collects node upserts and activity inserts in an in-memory
+    queue and commits them to the databases in group batches, so the
+    meshtastic callback thread never waits on the disk.
+    A batch is committed when it reaches 'db_batch_size' records or when
+    'db_batch_ms' milliseconds have passed since its first record.
+    """
+
+    def __init__(self, nodesdb=None, activitydb=None, config=None, logging=None, metrics=None):
+        """
+        Initialize the write-behind queue.
+        :param nodesdb: The node registry where node information is stored.
+        :param activitydb: The activity store where node activity is appended.
+        :param config: The configuration object that contains the batch settings.
+        :param logging: Logger instance for logging messages.
+        :param metrics: Optional metrics registry for the commit latency and queue depth.
+        """
+        self.nodesdb = nodesdb
+        self.activitydb = activitydb
+        self.config = config
+        self.logging = logging
+        self.batch_size = int(self.config.get('db_batch_size', 50))
+        self.batch_ms = int(self.config.get('db_batch_ms', 500))
+        self.status = False
+
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._commit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._records = 0
+        self._last_commit_ms = 0.0
+        self._max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+
+        self._commit_seconds = None
+        if metrics is not None:
+            self._commit_seconds = metrics.histogram('mesh_db_commit_seconds',
+                                                     'Time to commit one batch of database writes')
+            metrics.gauge('mesh_db_write_queue_depth',
+                          'Database writes waiting in the write-behind queue').set_function(self._queue.qsize)
+
+    def upsert_node(self, record):
+        """
+        Queue a node record to be upserted by its 'num'.
+        :param record: Node record dict.
+        """
+        self._queue.put(('node', record))
+
+    def insert_activity(self, record):
+        """
+        Queue an activity record to be appended to the activity store.
+        :param record: Activity record dict.
+        """
+        self._queue.put(('activity', record))
+
+    def start(self):
+        """Start the write-behind thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """
+        Run the write-behind loop, committing queued records in batches
+        until stop() is called. The batch being collected and everything
+        still queued are committed before the loop returns.
+        """
+        self.status = True
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.batch_ms / 1000
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+        self.flush()
+        self.status = False
+
+    def stop(self, timeout=30):
+        """
+        Stop the write-behind loop and wait until it has committed the
+        in-flight batch and the queue, so the databases can be closed.
+        :param timeout: Maximum seconds to wait for the thread.
+        """
+        self._stopping.set()
+        self._queue.put(_STOP)  # wakes the loop while it waits for a batch to fill
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                self.logging.warning("Write-behind thread did not stop in time")
+        # records queued after the loop returned, or without a thread at all
+        self.flush()
+
+    def flush(self):
+        """
+        Commit everything that is currently queued.
+        Called on shutdown and after bulk operations such as the initial sync.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """
+        Write one batch of queued records.
+        Node upserts are merged by node number so each node is written once,
+        in a single pass over the node table; later fields win.
+        :param batch: List of (kind, record) tuples taken from the queue.
+        """
+        batch = [item for item in batch if item is not _STOP]
+        if not batch:
+            return
+        nodes = {}
+        activities = []
+        for kind, record in batch:
+            if kind == 'node':
+                merged = nodes.setdefault(record.get('num'), {})
+                if record.get('id') is None and merged.get('id'):
+                    # keep the id of an earlier record in the batch
+                    record = {key: value for key, value in record.items() if key != 'id'}
+                merged.update(record)
+            else:
+                activities.append(record)
+
+        start = time.perf_counter()
+        with self._commit_lock:
+            try:
+                if nodes:
+                    self.nodesdb.upsert_many(nodes.values())
+                if activities:
+                    self.activitydb.insert_many(activities)
+            except Exception as e:
+                self.logging.error(f"Failed to commit database batch: {e}")
+                return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self._commit_seconds is not None:
+            self._commit_seconds.observe(elapsed_ms / 1000)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._records += len(batch)
+            self._last_commit_ms = elapsed_ms
+            self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
+            self._total_commit_ms += elapsed_ms
+        self.logging.debug(f"Committed {len(batch)} records in {elapsed_ms:.1f} ms")
+
+    def stats(self):
+        """
+        Return the write-behind counters.
+        :return: Dict with queue depth, batch/record counts and commit latency in ms.
+        """
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'records': self._records,
+                'last_commit_ms': self._last_commit_ms,
+                'max_commit_ms': self._max_commit_ms,
+                'avg_commit_ms': self._total_commit_ms / self._batches if self._batches else 0.0
+            }
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of the distance helpers in tools/general.py.
+
+Compares, for distances from one point to N nodes:
+  - per_call:  the old path, a new general() and a geopy import per pair
+  - geodesic:  get_distances(exact=True), one geodesic per point
+  - haversine: get_distances(), vectorized with NumPy
+and reports the largest haversine error against the geodesic.
+
+Usage:
+    python -m tools.bench_distance [--nodes 500] [--repeat 5]
+"""
+
+import argparse
+import random
+import timeit
+
+import tools.general as general_tools
+
+def old_get_distance(lat1, lon1, lat2, lon2):
+    """The previous per-pair implementation, kept for comparison."""
+    from geopy.distance import geodesic
+    return geodesic((lat1, lon1), (lat2, lon2)).kilometers
+
+def per_call(lat, lon, lats, lons):
+    return [old_get_distance(lat, lon, lat2, lon2) for lat2, lon2 in zip(lats, lons)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the distance helpers.")
+    parser.add_argument('--nodes', type=int, default=500, help="number of node positions")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per method, the best is reported")
+    parser.add_argument('--lat', type=float, default=57.7785, help="latitude of the origin")
+    parser.add_argument('--lon', type=float, default=14.1697, help="longitude of the origin")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    lats = [args.lat + rng.uniform(-1.0, 1.0) for _ in range(args.nodes)]
+    lons = [args.lon + rng.uniform(-2.0, 2.0) for _ in range(args.nodes)]
+    geo = general_tools.general()
+
+    methods = {
+        'per_call': lambda: per_call(args.lat, args.lon, lats, lons),
+        'geodesic': lambda: geo.get_distances(args.lat, args.lon, lats, lons, exact=True),
+        'haversine': lambda: geo.get_distances(args.lat, args.lon, lats, lons),
+    }
+    print(f"{args.nodes} nodes, best of {args.repeat} runs")
+    baseline = None
+    for name, method in methods.items():
+        best = min(timeit.repeat(method, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"  {name:<10} {best * 1000:10.3f} ms  {best / args.nodes * 1e6:8.2f} us/node  x{baseline / best:,.1f}")
+
+    exact = geo.get_distances(args.lat, args.lon, lats, lons, exact=True)
+    fast = geo.get_distances(args.lat, args.lon, lats, lons)
+    error = abs(fast - exact)
+    print(f"  haversine error: max {error.max() * 1000:.1f} m, max {(error / exact).max() * 100:.3f} %")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Stand-in for meshtastic.serial_interface.SerialInterface.
+
+It offers the attributes and methods the repeater uses (nodes, localNode,
+getMyUser, getMyNodeInfo, getLongName, sendText, close) without a radio,
+so handlers, dbsync and broadcast can run offline. Sent messages are kept
+in 'sent' and the node list is updated from the packets it is fed.
+"""
+
+import time
+
+class FakeLocalNode:
+    """Stand-in for meshtastic.node.Node of the local radio."""
+
+    def __init__(self, nodeNum):
+        self.nodeNum = nodeNum
+        self.time = None
+
+    def setTime(self, timeSec=0):
+        self.time = timeSec
+
+class FakeSerialInterface:
+    """Offline stand-in for the meshtastic serial interface."""
+
+    def __init__(self, nodeNum=0x7e57c0de, longName="Replay Repeater", shortName="RPLY",
+                 hwModel="PORTDUINO", airUtilTx=0.0):
+        """
+        Create the fake interface with a local node in its node list.
+        :param nodeNum: Node number of the fake local radio.
+        :param longName: Long name of the fake local radio.
+        :param shortName: Short name of the fake local radio.
+        :param hwModel: Hardware model of the fake local radio.
+        :param airUtilTx: airUtilTx percentage reported for the local radio.
+        """
+        self.localNode = FakeLocalNode(nodeNum)
+        self.myId = '!' + hex(nodeNum)[2:]
+        self.nodes = {
+            self.myId: {
+                'num': nodeNum,
+                'user': {
+                    'id': self.myId,
+                    'longName': longName,
+                    'shortName': shortName,
+                    'hwModel': hwModel
+                },
+                'deviceMetrics': {
+                    'channelUtilization': 0.0,
+                    'airUtilTx': airUtilTx,
+                    'uptimeSeconds': 0
+                }
+            }
+        }
+        self.sent = []
+        self.closed = False
+
+    def getMyNodeInfo(self):
+        return self.nodes[self.myId]
+
+    def getMyUser(self):
+        return self.nodes[self.myId]['user']
+
+    def getLongName(self):
+        return self.getMyUser().get('longName')
+
+    def getShortName(self):
+        return self.getMyUser().get('shortName')
+
+    def sendText(self, text, destinationId="^all", wantAck=False, wantResponse=False, channelIndex=0, **kwargs):
+        """Record the message instead of sending it."""
+        self.sent.append({'time': time.time(), 'text': text, 'destinationId': destinationId})
+
+    def close(self):
+        self.closed = True
+
+    def update_from_packet(self, packet):
+        """
+        Update the node list the way the real interface does for received packets.
+        :param packet: The packet dict being replayed.
+        """
+        num = packet.get('from')
+        if num is None:
+            return
+        node_id = packet.get('fromId') or '!' + hex(num)[2:]
+        node = self.nodes.setdefault(node_id, {'num': num})
+        node['lastHeard'] = int(time.time())
+        decoded = packet.get('decoded', {})
+        match decoded.get('portnum'):
+            case "NODEINFO_APP":
+                node['user'] = dict(decoded.get('user', {}))
+            case "POSITION_APP":
+                node['position'] = dict(decoded.get('position', {}))
+            case "TELEMETRY_APP":
+                metrics = decoded.get('telemetry', {}).get('deviceMetrics')
+                if metrics:
+                    node['deviceMetrics'] = dict(metrics)
@@ -1,3 +1,25 @@
+import numpy as np
+from geopy.distance import geodesic
+
+EARTH_RADIUS_KM = 6371.0088  # mean earth radius
+
+def haversine(lat, lon, lats, lons):
+    """
+    Great-circle distance from one point to many points, vectorized with NumPy.
+    Within about 0.5% of the geodesic distance on the WGS-84 ellipsoid.
+    :param lat: Latitude of the origin in degrees
+    :param lon: Longitude of the origin in degrees
+    :param lats: Sequence or array of latitudes in degrees
+    :param lons: Sequence or array of longitudes in degrees
+    :return: NumPy array of distances in kilometers
+    """
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=float))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lons, dtype=float) - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
 class general:
     def __init__(self):
         pass
@@ -11,9 +33,25 @@ class general:
         :param lon2: Longitude of point 2
         :return: Distance in kilometers
         """
-        from geopy.distance import geodesic
         return geodesic((lat1, lon1), (lat2, lon2)).kilometers
-    
+
+    def get_distances(self, lat, lon, lats, lons, exact=False):
+        """
+        Calculate the distances from one geographical point to many points.
+        :param lat: Latitude of the origin
+        :param lon: Longitude of the origin
+        :param lats: Latitudes of the points
+        :param lons: Longitudes of the points
+        :param exact: Use the geodesic on the WGS-84 ellipsoid instead of the
+                      vectorized haversine (one geopy call per point, much slower)
+        :return: NumPy array of distances in kilometers
+        """
+        if not exact:
+            return haversine(lat, lon, lats, lons)
+        return np.fromiter((geodesic((lat, lon), (lat2, lon2)).kilometers
+                            for lat2, lon2 in zip(lats, lons)),
+                           dtype=float, count=len(lats))
+
     @staticmethod
     def get_version():
         return "1.0.0"
@@ -21,7 +59,7 @@ class general:
     @staticmethod
     def get_author():
         return "JC Visagie"
-    
+
     @staticmethod
     def get_description():
-        return "This module provides general utility functions."
\ No newline at end of file
+        return "This module provides general utility functions."
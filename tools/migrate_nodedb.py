@@ -0,0 +1,184 @@
+"""
+Migration of the legacy TinyDB activity log.
+
+Older versions stored every packet in the 'NodeActivities' table of the
+TinyDB file (db/nodedb.json) with 'Time_Heard' as a '%Y%m%d_%H%M%S' string.
+This tool streams that file, moves the activity records into the activity
+store with epoch timestamps, and rewrites the TinyDB file without them.
+The file is parsed document by document, so it never has to fit in memory.
+The import is recorded in the activity store in the same transaction as
+the records, so a crash before the TinyDB file is rewritten does not
+import them twice.
+
+Usage:
+    python -m tools.migrate_nodedb [config/config.json]
+"""
+
+import json
+import os
+import sys
+
+CHUNK_SIZE = 1 << 16
+MIGRATION = 'tinydb_node_activities'
+
+class _StreamReader:
+    """Incremental reader for the nested objects of a TinyDB JSON file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read the next chunk, dropping the part of the buffer already parsed."""
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of database file")
+            self._fill()
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be char."""
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the buffer")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+
+    def members(self):
+        """
+        Yield the keys of the object at the current position.
+        The caller must decode each member value before asking for the next key.
+        """
+        self.expect('{')
+        first = True
+        while True:
+            if self.peek() == '}':
+                self.pos += 1
+                return
+            if not first:
+                self.expect(',')
+            first = False
+            key = self.value()
+            self.expect(':')
+            yield key
+
+def iter_tables(f):
+    """
+    Yield (table name, documents) for every table of a TinyDB JSON file.
+    documents is a generator of (doc_id, document) that must be consumed
+    before the next table is requested.
+    :param f: Text file object of the TinyDB database.
+    """
+    reader = _StreamReader(f)
+
+    def documents():
+        for doc_id in reader.members():
+            yield doc_id, reader.value()
+
+    for table in reader.members():
+        yield table, documents()
+
+def has_table(path, name):
+    """
+    Tell whether a TinyDB file contains a table, reading it without writing.
+    :param path: Path to the TinyDB database file.
+    :param name: Name of the table.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for table, documents in iter_tables(f):
+            if table == name:
+                return True
+            for _ in documents:
+                pass
+    return False
+
+def migrate(path, store):
+    """
+    Move the 'NodeActivities' table of a TinyDB file into the activity store.
+    The TinyDB file is only rewritten when it contains activity records;
+    records of an import that already finished are dropped, not imported again.
+    :param path: Path to the TinyDB database file.
+    :param store: The activity store that receives the records.
+    :return: Number of activity records migrated.
+    """
+    from modules.activityStore import legacy_time_to_epoch
+
+    if not path or not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    if not has_table(path, 'NodeActivities'):
+        return 0
+
+    def records(documents):
+        for _, doc in documents:
+            doc['Time_Heard'] = legacy_time_to_epoch(doc.get('Time_Heard'))
+            yield doc
+
+    done = store.migrated(MIGRATION)
+    migrated = 0
+    tmp_path = path + '.tmp'
+    with open(path, 'r', encoding='utf-8') as src, \
+            open(tmp_path, 'w', encoding='utf-8') as dst:
+        dst.write('{')
+        first_table = True
+        for table, documents in iter_tables(src):
+            if table == 'NodeActivities':
+                if done:
+                    for _ in documents:
+                        pass
+                else:
+                    migrated = store.import_records(records(documents), MIGRATION)
+                continue
+            # copy every other table unchanged
+            dst.write(('' if first_table else ', ') + json.dumps(table) + ': {')
+            first_table = False
+            first_doc = True
+            for doc_id, doc in documents:
+                dst.write(('' if first_doc else ', ') + json.dumps(doc_id) + ': ' + json.dumps(doc))
+                first_doc = False
+            dst.write('}')
+        dst.write('}')
+
+    os.replace(tmp_path, path)
+    return migrated
+
+def main():
+    """Run the migration for the database paths in the configuration file."""
+    import modules.activityStore as activityStore
+
+    config_path = sys.argv[1] if len(sys.argv) > 1 else 'config/config.json'
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    store = activityStore.open_store(config)
+    try:
+        migrated = migrate(config.get('database_path', ''), store)
+    finally:
+        store.close()
+    print(f"Migrated {migrated} activity records")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Replay a packet capture through the repeater without a radio.
+
+Packets recorded with 'capture_on' are fed to main.onReceive on a
+FakeSerialInterface, so dedup, the ingest pipeline, the command handlers,
+the write-behind queue, dbsync and the scheduled beacon all run for real.
+The databases are created in a work directory, the live ones are never
+touched, and messages the repeater would send are kept by the fake
+interface instead of going on air.
+
+Usage:
+    python -m tools.replay logs/packets.jsonl.gz [--speed 1] [--workdir DIR]
+
+--speed 1 replays with the recorded timing, 10 ten times faster and
+0 as fast as possible.
+
+The replay is deterministic: one ingest worker is used, each packet is
+handled and its database writes are committed before the next one is
+fed, and the packet handling code (dedup, command rate limits, heard
+times, signal history) reads a virtual clock set from the capture
+timestamps, so every run and every speed gives the same results.
+--concurrent feeds packets without waiting, to measure throughput with
+the configured workers; results may then differ between runs. The
+transmitter and the scheduled beacon always run on the real clock.
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from rich.console import Console
+
+import main
+import modules.broadcast as broadcast
+import modules.commands as cmdRegistry
+import modules.dedup as dedup
+import modules.lastHeard as lastHeard
+import modules.signalHistory as signalHistory
+import modules.dbSync as dbSync
+import modules.scheduler as jobScheduler
+import modules.shared as SharedState
+import modules.transmitter as transmitter
+from modules.capture import read_capture, read_header
+from tools.fake_interface import FakeSerialInterface
+
+class virtualclock:
+    """
+    Stand-in for the time module in the packet handling modules.
+    time() and monotonic() return the capture time of the packet being
+    replayed, everything else is the real time module.
+    """
+
+    # modules whose packet handling reads the clock
+    MODULES = (main, cmdRegistry, dedup, lastHeard, signalHistory)
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def install(self):
+        for module in self.MODULES:
+            module.time = self
+
+    def uninstall(self):
+        for module in self.MODULES:
+            module.time = time
+
+def setup(config, workdir, concurrent=False):
+    """
+    Initialize the parts of main that handle received packets, wired to a
+    fake interface and databases in the work directory.
+    The web UI, MET and GPS services are not started.
+    :param config: The configuration dict, a copy is modified for the replay.
+    :param workdir: Directory for the replay databases.
+    :param concurrent: Keep the configured ingest workers and the write-behind thread.
+    :return: The fake interface.
+    """
+    config = dict(config)
+    config['database_path'] = os.path.join(workdir, 'nodedb.json')
+    config['activity_db_path'] = os.path.join(workdir, 'activity.db')
+    config['capture_on'] = 'Disabled'
+    # replies are only recorded, there is no channel to protect
+    config['tx_min_gap_ms'] = '0'
+    if not concurrent:
+        # one worker handles the packets in capture order
+        config['ingest_workers'] = '1'
+
+    main.console = Console(quiet=True)
+    main.config = config
+    main.interface = FakeSerialInterface()
+    main.init_metrics()
+    main.init_commands()
+    main.init_pipeline()
+    main.init_db()
+    if not concurrent:
+        # writes are committed by settle() after every packet instead
+        main.writer.stop()
+
+    main.shared_data = SharedState.SharedState()
+    main.tx = transmitter.transmitter(interface=main.interface,
+                                      config=config,
+                                      logging=logging,
+                                      metrics=main.Metrics)
+    threading.Thread(target=main.tx.run, daemon=True).start()
+
+    main.syncer = dbSync.dbsync(interface=main.interface,
+                                config=config,
+                                nodesdb=main.Nodes,
+                                logging=logging,
+                                metrics=main.Metrics)
+
+    main.broadcaster = broadcast.broadcast(transmitter=main.tx,
+                                           config=config,
+                                           shared_data=main.shared_data,
+                                           lastheard=main.LastHeard,
+                                           logging=logging)
+    main.Scheduler = jobScheduler.scheduler(logging=logging)
+    main.Scheduler.add("broadcast", main.broadcaster.tick, main.broadcaster.interval)
+    threading.Thread(target=main.Scheduler.run, daemon=True).start()
+
+    main.ingest.start()
+    return main.interface
+
+def replay(path, interface, speed=1.0, clock=None, concurrent=False):
+    """
+    Feed the packets of a capture to main.onReceive.
+    :param path: Path of the capture file.
+    :param interface: The fake interface the packets are received on.
+    :param speed: Replay speed relative to the recording, 0 for as fast as possible.
+    :param clock: Optional virtualclock, set to the capture time of each packet.
+    :param concurrent: Feed the next packet without waiting for the previous one.
+    :return: Number of packets replayed.
+    """
+    started = read_header(path).get('started', 0)
+    start = time.monotonic()
+    count = 0
+    for offset, packet in read_capture(path):
+        if speed > 0:
+            delay = start + offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if clock is not None:
+            clock.now = started + offset
+        interface.update_from_packet(packet)
+        main.onReceive(packet, interface)
+        if not concurrent:
+            settle()
+        count += 1
+    return count
+
+def settle(timeout=60, poll=0.0002):
+    """
+    Wait until the pipeline has handled every submitted packet and commit
+    the queued database writes.
+    :param timeout: Maximum seconds to wait for the pipeline.
+    :param poll: Seconds between two checks of the pipeline counters.
+    :return: True if the pipeline drained within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    drained = False
+    while time.monotonic() < deadline:
+        stats = main.ingest.stats()
+        handled = sum(entry['count'] for entry in stats['portnums'].values())
+        if handled + stats['dropped'] >= stats['submitted']:
+            drained = True
+            break
+        time.sleep(poll)
+    main.writer.flush()
+    return drained
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay a packet capture through the repeater handlers.")
+    parser.add_argument('capture', help="capture file written with 'capture_on' enabled")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed relative to the recording, 0 for as fast as possible")
+    parser.add_argument('--config', default='config/config.json', help="configuration file")
+    parser.add_argument('--metrics', default=None, help="write the metrics in the Prometheus text format to this file")
+    parser.add_argument('--workdir', default=None, help="directory for the replay databases (default: a temporary directory)")
+    parser.add_argument('--concurrent', action='store_true',
+                        help="do not wait for each packet and use the configured ingest workers and the real clock; "
+                             "measures throughput, results may differ between runs")
+    args = parser.parse_args()
+
+    config = main.loadConfig(args.config)
+    if config is None:
+        raise SystemExit(f"Could not load {args.config}")
+    workdir = args.workdir or tempfile.mkdtemp(prefix='mesh-replay-')
+    os.makedirs(workdir, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(workdir, 'replay.log'), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    interface = setup(config, workdir, concurrent=args.concurrent)
+    clock = None
+    if not args.concurrent:
+        clock = virtualclock(read_header(args.capture).get('started', 0))
+        clock.install()
+
+    start = time.perf_counter()
+    count = replay(args.capture, interface, args.speed, clock=clock, concurrent=args.concurrent)
+    drained = settle(poll=0.01)
+    elapsed = time.perf_counter() - start
+
+    sync = main.syncer.now()
+    main.broadcaster.tick()
+    # give the transmitter a moment to hand the queued replies to the fake interface
+    time.sleep(0.5)
+
+    report = {
+        'packets': count,
+        'elapsed_s': round(elapsed, 3),
+        'packets_per_s': round(count / elapsed, 1) if elapsed > 0 else None,
+        'drained': drained,
+        'pipeline': main.ingest.stats(),
+        'dedup': main.seen_packets.stats(),
+        'db_writes': main.writer.stats(),
+        'commands': main.commands.stats(),
+        'transmit': main.tx.stats(),
+        'dbsync': sync,
+        'sent': interface.sent,
+        'workdir': workdir
+    }
+    print(json.dumps(report, indent=2, default=str))
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(main.Metrics.render())
+
+    main.Scheduler.stop()
+    main.tx.stop()
+    main.ingest.stop()
+    main.writer.stop()
+    main.db.close()
+    main.NodeActivities.close()
+    if clock is not None:
+        clock.uninstall()
+
+if __name__ == "__main__":
+    main_cli()